@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from lib.codec import KTB_PAIR, KTB_COUNT, FTB_GLYPH
+
+# Benchmarks for the hot paths, run on synthetic files generated into a temp directory.
+#   python benchmark.py --save          record the current timings as the baseline
+#   python benchmark.py                 compare against the baseline, exit code 1 on regressions
+#   python benchmark.py -k escape       only run benchmarks whose name contains "escape"
+# Benchmarks whose dependencies (PyQt5, PIL, dotenv, output/thaiji.csv, fonts) are missing are skipped.
+
+BASELINE_PATH = "output/benchmark_baseline.json"
+THAI = [chr(c) for c in range(0x0e01, 0x0e4e)]
+
+def thai_text(size: int) -> str:
+	random.seed(size)
+	words = ["".join(random.choice(THAI) for _ in range(random.randint(2, 8))) for _ in range(500)]
+	text = []
+	length = 0
+	while length < size:
+		word = random.choice(words)
+		text.append(word)
+		length += len(word) + 1
+	return " ".join(text)[:size]
+
+def write_ktb_fixture(path: str, count: int):
+	random.seed(count)
+	codes = list(range(33, 127)) + list(range(3585, 3676))
+	with open(path, "wb") as f:
+		f.write(KTB_COUNT.pack(count))
+		for _ in range(count):
+			f.write(KTB_PAIR.pack(random.choice(codes), random.choice(codes), random.randint(-20, 20)))
+
+def write_ftb_fixture(path: str, count: int):
+	# minimal FTB header: magic, glyph count at 0x7a, glyph table offset at 0x80
+	random.seed(count)
+	header = bytearray(0x84)
+	header[0:4] = b"FTB\x20"
+	header[0x7a:0x7c] = count.to_bytes(2, "little")
+	header[0x80:0x84] = len(header).to_bytes(4, "little")
+	with open(path, "wb") as f:
+		f.write(header)
+		for i in range(count):
+			f.write(FTB_GLYPH.pack((i * 7) % 0xffff, random.randint(0, 3), 30, 52, random.randint(0, 2000), random.randint(0, 2000)))
+
+def write_properties_fixture(directory: str, files: int, rows: int):
+	for name in ("eng", "jp", "th"):
+		os.makedirs(f"{directory}/{name}", exist_ok=True)
+	for i in range(files):
+		keys = [f"key{j}" for j in range(rows)]
+		with open(f"{directory}/eng/file{i}.properties", "w", encoding="utf-8") as f:
+			f.writelines(f"{key}=English {key}\n" for key in keys)
+		with open(f"{directory}/jp/file{i}.properties", "w", encoding="utf-8") as f:
+			f.writelines(f"{key}=Japanese {key}\n" for key in keys)
+		with open(f"{directory}/th/file{i}_th.properties", "w", encoding="utf-8") as f:
+			f.writelines(f"{key}={thai_text(40 + j % 7)}\n" for j, key in enumerate(keys))
+
+def measure(function, repeat: int) -> "list[float]":
+	times = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		times.append(time.perf_counter() - start)
+	return times
+
+def benchmarks(directory: str, filter: str = "") -> "Iterator[tuple[str, object]]":
+	# yields (name, function), or (name, reason) for benchmarks that cannot run here.
+	# Fixtures are only built and modules only imported for names that contain filter.
+	def selected(*names: str) -> bool:
+		return any(filter in name for name in names)
+
+	sizes = [size for size in (1000, 10000, 100000) if selected(f"string_to_unicode_escape[{size}]", f"string_to_thaiji_escape[{size}]")]
+	if sizes:
+		import unicodeescape
+	for size in sizes:
+		text = thai_text(size)
+		if selected(f"string_to_unicode_escape[{size}]"):
+			yield f"string_to_unicode_escape[{size}]", lambda text=text: unicodeescape.string_to_unicode_escape(text)
+		if not selected(f"string_to_thaiji_escape[{size}]"):
+			continue
+		if os.path.exists(unicodeescape.THAIJI_PATH):
+			yield f"string_to_thaiji_escape[{size}]", lambda text=text: unicodeescape.string_to_thaiji_escape(text)
+		else:
+			yield f"string_to_thaiji_escape[{size}]", f"{unicodeescape.THAIJI_PATH} not found"
+
+	# both formats store a uint16 record count, so 65535 is the largest valid file
+	counts = [count for count in (1000, 10000, 65535) if selected(*(f"{name}[{count}]" for name in ("ktb.File.parse", "ktb.File.rewrite", "ftb.File.parse", "ftb.File.rewrite"))) or (count == 65535 and selected("FileLoader.parse_ktb[65535]"))]
+	if counts:
+		from lib import ktb, ftb
+	for count in counts:
+		path = f"{directory}/{count}.ktb"
+		if selected(f"ktb.File.parse[{count}]", f"ktb.File.rewrite[{count}]") or (count == 65535 and selected("FileLoader.parse_ktb[65535]")):
+			write_ktb_fixture(path, count)
+		if selected(f"ktb.File.parse[{count}]"):
+			yield f"ktb.File.parse[{count}]", lambda path=path: ktb.File.parse(path)
+		if selected(f"ktb.File.rewrite[{count}]"):
+			parsed = ktb.File.parse(path)
+			yield f"ktb.File.rewrite[{count}]", lambda parsed=parsed: parsed.rewrite(f"{directory}/out.ktb")
+
+		path = f"{directory}/{count}.ftb"
+		if selected(f"ftb.File.parse[{count}]", f"ftb.File.rewrite[{count}]"):
+			write_ftb_fixture(path, count)
+		if selected(f"ftb.File.parse[{count}]"):
+			yield f"ftb.File.parse[{count}]", lambda path=path: ftb.File.parse(path)
+		if selected(f"ftb.File.rewrite[{count}]"):
+			parsed = ftb.File.parse(path)
+			yield f"ftb.File.rewrite[{count}]", lambda parsed=parsed: parsed.rewrite(f"{directory}/out.ftb")
+
+	if selected("FileLoader.parse_ktb[65535]"):
+		try:
+			from ktb_parser_gui import FileLoader
+		except ImportError as e:
+			yield "FileLoader.parse_ktb[65535]", str(e)
+		else:
+			loader = FileLoader(f"{directory}/65535.ktb")
+			yield "FileLoader.parse_ktb[65535]", lambda: loader.parse_ktb(loader.file_path)
+
+	if selected("pack_csv+unpack_csv[20x500]"):
+		try:
+			import pack_csv
+			import unpack_csv
+			import unicodeescape
+		except ImportError as e:
+			yield "pack_csv+unpack_csv[20x500]", str(e)
+		else:
+			if os.path.exists(unicodeescape.THAIJI_PATH):
+				write_properties_fixture(f"{directory}/text", 20, 500)
+				def round_trip():
+					for i in range(20):
+						pack_csv.pack_csv(f"{directory}/text/csv/file{i}.csv", f"{directory}/text/eng/file{i}.properties", f"{directory}/text/jp/file{i}.properties", f"{directory}/text/th/file{i}_th.properties")
+						unpack_csv.write_properties_file(f"{directory}/text/out/file{i}_th.properties", unpack_csv.iter_csv(f"{directory}/text/csv/file{i}.csv"))
+				yield "pack_csv+unpack_csv[20x500]", round_trip
+			else:
+				yield "pack_csv+unpack_csv[20x500]", f"{unicodeescape.THAIJI_PATH} not found"
+
+	if selected("text_to_image[100 glyphs]"):
+		try:
+			import thaijigenerator
+		except ImportError as e:
+			yield "text_to_image[100 glyphs]", str(e)
+		else:
+			font = thaijigenerator.fonts["font_01"]
+			if os.path.exists(font["path"]):
+				glyphs = [chr(c) for c in range(33, 127)] + THAI[:6]
+				def render():
+					for i, glyph in enumerate(glyphs):
+						thaijigenerator.text_to_image(glyph, font["path"], font["size"], f"{directory}/glyphs/{i}.png", font["cell_height"], font["padding_x"], False, "font_01")
+				yield "text_to_image[100 glyphs]", render
+			else:
+				yield "text_to_image[100 glyphs]", f"{font['path']} not found"
+
+def main(argv: "list[str]" = None) -> int:
+	parser = argparse.ArgumentParser(description="Benchmark the nier-tools hot paths")
+	parser.add_argument("-k", dest="filter", default="", help="only run benchmarks whose name contains this")
+	parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark, the median is reported")
+	parser.add_argument("--save", action="store_true", help=f"store the results as the baseline in {BASELINE_PATH}")
+	parser.add_argument("--threshold", type=float, default=0.2, help="flag benchmarks this much slower than the baseline")
+	args = parser.parse_args(argv)
+
+	baseline = {}
+	if os.path.exists(BASELINE_PATH):
+		with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+			baseline = json.load(f)
+
+	results = {}
+	regressions = []
+	with tempfile.TemporaryDirectory() as directory:
+		for name, function in benchmarks(directory, args.filter):
+			if isinstance(function, str):
+				print(f"{name:<40} skipped: {function}")
+				continue
+			median = statistics.median(measure(function, args.repeat))
+			results[name] = median
+			line = f"{name:<40} {median * 1000:10.2f}ms"
+			if name in baseline:
+				change = median / baseline[name] - 1
+				line += f" {change:+7.1%}"
+				if change > args.threshold:
+					line += "  REGRESSION"
+					regressions.append(name)
+			print(line)
+
+	if args.save:
+		baseline.update(results)
+		os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+		with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+			json.dump(baseline, f, indent=1, sort_keys=True)
+		print(f"Saved {len(results)} results to {BASELINE_PATH}")
+	elif regressions:
+		print(f"{len(regressions)} benchmarks regressed more than {args.threshold:.0%}")
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
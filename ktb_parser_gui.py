@@ -1,102 +1,455 @@
+import os
 import sys
 import json
+import shutil
+import tempfile
+import time
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from array import array
 import lib.unicodetools as ut
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QAction, QFileDialog, QTableWidget, QTableWidgetItem,
+from lib.codec import read_ktb_columns, write_ktb_columns, char_to_code
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QAction, QFileDialog, QTableView,
                              QPushButton, QVBoxLayout, QWidget, QHBoxLayout, QMessageBox, QProgressBar, 
                              QLineEdit, QComboBox, QLabel, QStyledItemDelegate, QMenu, QAbstractItemView)
 from PyQt5.QtGui import QColor, QFont, QDrag
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QMimeData
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QMimeData, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
 
-class DraggableTableWidget(QTableWidget):
+class DraggableTableView(QTableView):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.setDragEnabled(True)
         self.setDragDropMode(QAbstractItemView.DragDrop)
         self.setSelectionBehavior(QAbstractItemView.SelectRows)
 
+    def sourceRow(self, index):
+        # row in the kerning model behind the filter proxy, -1 for no row
+        if not index.isValid():
+            return -1
+        return self.model().mapToSource(index).row()
+
     def dropEvent(self, event):
-        source_index = self.currentRow()
-        target_index = self.indexAt(event.pos()).row()
+        source_index = self.sourceRow(self.currentIndex())
+        target_index = self.sourceRow(self.indexAt(event.pos()))
 
-        if target_index < 0 or target_index == source_index:
+        if source_index < 0 or target_index < 0 or target_index == source_index:
             return
 
-        # Swap the rows in the table
-        for column in range(self.columnCount()):
-            source_item = self.takeItem(source_index, column)
-            target_item = self.takeItem(target_index, column)
-            self.setItem(source_index, column, target_item)
-            self.setItem(target_index, column, source_item)
+        # Swap the rows in the model
+        self.model().sourceModel().swapRows(source_index, target_index)
 
         event.accept()
 
-class UnicodeTableWidgetItem(QTableWidgetItem):
-    def __init__(self, text):
-        super().__init__(text)
-        self.updateTooltip()
-
-    def setText(self, text):
-        super().setText(text)
-        self.updateTooltip()
-
-    def updateTooltip(self):
-        text = self.text()
+class KerningTableModel(QAbstractTableModel):
+    # Kerning pairs kept as parallel arrays: uint16 code points (0 for an empty cell), int16 kerning
+    # and a stable id per row. Text, tooltips and colours are only produced when the view asks for them.
+    # pair_rows maps (first, second) to the ids of the rows holding that pair, so duplicates are found in O(1),
+    # and column_rows maps each column's value to the ids of the rows holding it for searching.
+    HEADERS = ['First Character', 'Second Character', 'Kerning']
+    duplicatesChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.firsts = array('H')
+        self.seconds = array('H')
+        self.kernings = array('h')
+        self.ids = array('L')
+        self.next_id = 0
+        self.pair_rows = {}
+        self.column_rows = ({}, {}, {})
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.kernings)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 3
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        flags = super().flags(index) | Qt.ItemIsDropEnabled
+        if index.isValid():
+            flags |= Qt.ItemIsEditable | Qt.ItemIsDragEnabled
+        return flags
+
+    def supportedDropActions(self):
+        return Qt.MoveAction | Qt.CopyAction
+
+    def text(self, row, column):
+        if column == 2:
+            return str(self.kernings[row])
+        code = self.firsts[row] if column == 0 else self.seconds[row]
+        return chr(code) if code else ''
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self.text(row, column)
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if column in [0, 1]:
+            if role == Qt.ToolTipRole:
+                code = self.firsts[row] if column == 0 else self.seconds[row]
+                if not code:
+                    return "Invalid Unicode"
+                return f"Dec: <b>{code:d}</b> Hex: <b>{code:04x}</b>"
+            if role == Qt.BackgroundRole:
+                return QColor(Qt.red) if self.isDuplicate(row) else QColor(Qt.white)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        row, column = index.row(), index.column()
         try:
-            if text.startswith("0x"):
-                text = chr(int(text, 16))
-            self.setToolTip(f"Dec: <b>{ord(text):d}</b> Hex: <b>{ord(text):04x}</b>")
-        except (ValueError, TypeError):
-            self.setToolTip("Invalid Unicode")
+            if column == 2:
+                kerning = int(value)
+                if not -32768 <= kerning <= 32767:
+                    return False
+                self._unindex(row)
+                self.kernings[row] = kerning
+                self._index(row)
+            else:
+                code = char_to_code(value)
+                was_duplicate = self.isDuplicate(row)
+                changed = self._unindex(row)
+                if column == 0:
+                    self.firsts[row] = code
+                else:
+                    self.seconds[row] = code
+                if self._index(row) or changed:
+                    # other rows in the old or new group changed too
+                    self._duplicatesChanged()
+                elif self.isDuplicate(row) != was_duplicate:
+                    # only this row left or joined a group of 3 or more
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, 1), [Qt.BackgroundRole])
+                    self.duplicatesChanged.emit()
+        except (ValueError, OverflowError):
+            return False
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def _index(self, row):
+        # returns True when the pair just became a duplicate
+        row_id = self.ids[row]
+        for value, rows in zip(self.pair(row), self.column_rows):
+            rows.setdefault(value, set()).add(row_id)
+        rows = self.pair_rows.setdefault((self.firsts[row], self.seconds[row]), set())
+        rows.add(row_id)
+        return len(rows) == 2
+
+    def _unindex(self, row):
+        # returns True when the pair is no longer a duplicate
+        row_id = self.ids[row]
+        for value, rows in zip(self.pair(row), self.column_rows):
+            rows[value].discard(row_id)
+            if not rows[value]:
+                del rows[value]
+        key = (self.firsts[row], self.seconds[row])
+        rows = self.pair_rows[key]
+        rows.discard(row_id)
+        if not rows:
+            del self.pair_rows[key]
+        return len(rows) == 1
+
+    def _rebuildIndex(self):
+        self.pair_rows = {}
+        self.column_rows = ({}, {}, {})
+        for row_id, first, second, kerning in zip(self.ids, self.firsts, self.seconds, self.kernings):
+            self.pair_rows.setdefault((first, second), set()).add(row_id)
+            for value, rows in zip((first, second, kerning), self.column_rows):
+                rows.setdefault(value, set()).add(row_id)
+
+    def _newIds(self, count):
+        ids = range(self.next_id, self.next_id + count)
+        self.next_id += count
+        return ids
+
+    def _duplicatesChanged(self):
+        # only the highlight changes, the view repaints just the visible cells
+        if len(self.kernings):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.kernings) - 1, 1), [Qt.BackgroundRole])
+        self.duplicatesChanged.emit()
+
+    def isDuplicate(self, row):
+        return len(self.pair_rows[(self.firsts[row], self.seconds[row])]) > 1
+
+    def duplicateIds(self):
+        return set().union(*(rows for rows in self.pair_rows.values() if len(rows) > 1))
+
+    def searchIds(self, column, text):
+        # ids of the rows matching a search, looked up in the column index instead of scanning every row.
+        # Character columns match a single character (case-insensitive), 0x/U+ hex or a decimal code point,
+        # the kerning column matches on a substring of the value.
+        rows = self.column_rows[column]
+        if column == 2:
+            return set().union(*(ids for value, ids in rows.items() if text in str(value)))
+
+        codes = set()
+        if len(text) == 1:
+            codes = {ord(text), ord(text.lower()[0]), ord(text.upper()[0])}
+        else:
+            try:
+                if text.lower().startswith(("0x", "u+")):
+                    codes = {int(text[2:], 16)}
+                elif text.isdigit():
+                    codes = {int(text)}
+            except ValueError:
+                pass
+        return set().union(*(rows.get(code, ()) for code in codes))
+
+    def setColumns(self, firsts, seconds, kernings):
+        self.beginResetModel()
+        self.firsts = array('H', firsts)
+        self.seconds = array('H', seconds)
+        self.kernings = array('h', kernings)
+        self.ids = array('L', self._newIds(len(self.kernings)))
+        self._rebuildIndex()
+        self.endResetModel()
+
+    def appendColumns(self, firsts, seconds, kernings):
+        start = len(self.kernings)
+        if not len(kernings):
+            return
+        self.beginInsertRows(QModelIndex(), start, start + len(kernings) - 1)
+        self.firsts.extend(firsts)
+        self.seconds.extend(seconds)
+        self.kernings.extend(kernings)
+        self.ids.extend(self._newIds(len(kernings)))
+        # index before endInsertRows, rowsInserted re-applies the filter from the index
+        changed = False
+        for row in range(start, len(self.kernings)):
+            changed = self._index(row) or changed
+        self.endInsertRows()
+        if changed:
+            self._duplicatesChanged()
+
+    def insertPair(self, row, first, second, kerning):
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.firsts.insert(row, first)
+        self.seconds.insert(row, second)
+        self.kernings.insert(row, kerning)
+        self.ids.insert(row, self._newIds(1)[0])
+        changed = self._index(row)
+        self.endInsertRows()
+        if changed:
+            self._duplicatesChanged()
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if row < 0 or count <= 0 or row + count > len(self.kernings):
+            return False
+        changed = False
+        for r in range(row, row + count):
+            changed = self._unindex(r) or changed
+        self.beginRemoveRows(parent, row, row + count - 1)
+        del self.firsts[row:row + count]
+        del self.seconds[row:row + count]
+        del self.kernings[row:row + count]
+        del self.ids[row:row + count]
+        self.endRemoveRows()
+        if changed:
+            self._duplicatesChanged()
+        return True
+
+    def swapRows(self, a, b):
+        # ids move with their rows, so the pair index stays valid
+        for column in (self.firsts, self.seconds, self.kernings, self.ids):
+            column[a], column[b] = column[b], column[a]
+        self.dataChanged.emit(self.index(a, 0), self.index(a, 2))
+        self.dataChanged.emit(self.index(b, 0), self.index(b, 2))
+
+    def pair(self, row):
+        return self.firsts[row], self.seconds[row], self.kernings[row]
+
+class KerningFilterProxyModel(QSortFilterProxyModel):
+    # Shows only the rows whose id is in accepted_ids (None shows every row); the whole view updates in one batch
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.accepted_ids = None
+
+    def setAcceptedIds(self, ids):
+        self.accepted_ids = ids
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self.accepted_ids is None or self.sourceModel().ids[source_row] in self.accepted_ids
 
 class FileLoader(QThread):
     progress = pyqtSignal(int)
-    finished = pyqtSignal(list)
+    rowsLoaded = pyqtSignal(object)
+    finished = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    # Rows are handed to the GUI in chunks, progress is emitted at most every PROGRESS_INTERVAL seconds
+    CHUNK_SIZE = 2000
+    PROGRESS_INTERVAL = 0.1
 
     def __init__(self, file_path):
         super().__init__()
         self.file_path = file_path
 
     def run(self):
-        kerning_list = self.parse_ktb(self.file_path)
-        self.finished.emit(kerning_list)
+        try:
+            firsts, seconds, kernings = self.parse_ktb(self.file_path)
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(len(kernings))
 
     def parse_ktb(self, file_path, is_tranform: bool = True):
-        def read_int(reader, num_bytes):
-            return int.from_bytes(reader.read(num_bytes), byteorder='little', signed=True)
+        with open(file_path, 'rb') as reader:
+            firsts, seconds, kernings = read_ktb_columns(reader.read())
+
+        # undo the Thai remapping on whole columns at once
+        if is_tranform:
+            firsts = ut.translate_codes(firsts, ut.UNICODE_MAP_INVERSE_TRANS)
+            seconds = ut.translate_codes(seconds, ut.UNICODE_MAP_INVERSE_TRANS)
+
+        count = len(kernings)
+        last_percent = -1
+        last_emit = 0.0
+        for start in range(0, count, self.CHUNK_SIZE):
+            end = min(start + self.CHUNK_SIZE, count)
+            self.rowsLoaded.emit((firsts[start:end], seconds[start:end], kernings[start:end]))
+
+            percent = int(end / count * 100)
+            now = time.monotonic()
+            if percent != last_percent and (percent == 100 or now - last_emit >= self.PROGRESS_INTERVAL):
+                self.progress.emit(percent)
+                last_percent = percent
+                last_emit = now
+        return firsts, seconds, kernings
+
+class FileSaver(QThread):
+    saved = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path, firsts, seconds, kernings, is_transform: bool = True):
+        super().__init__()
+        self.file_path = file_path
+        self.is_transform = is_transform
+        # copies, so edits made while saving don't change the file
+        self.firsts, self.seconds, self.kernings = array('H', firsts), array('H', seconds), array('h', kernings)
 
-        def read_utf16(reader, num_bytes):
-            return reader.read(num_bytes).decode('utf-16le')
+    def run(self):
+        try:
+            self.write_ktb(self.file_path)
+        except OSError as e:
+            self.failed.emit(str(e))
+            return
+        self.saved.emit(self.file_path)
 
-        with open(file_path, 'rb') as reader:
-            count = read_int(reader, 2)
-            kerning_list = []
-            for i in range(count):
-                left = read_utf16(reader, 2)
-                right = read_utf16(reader, 2)
-                kerning = read_int(reader, 2)
-
-                if is_tranform:
-                    for k, v in ut.UNICODE_MAP.items():
-                        if left == v:
-                            left = k
-                        if right == v:
-                            right = k
-
-                kerning_entry = {
-                    "first_character": left,
-                    "second_character": right,
-                    "kerning": kerning
-                }
-                kerning_list.append(kerning_entry)
-                self.progress.emit(int((i + 1) / count * 100))
-        return kerning_list
+    def write_ktb(self, file_path):
+        # serialize into one buffer, write it next to the target and swap it in, a failed save leaves the old file intact
+        firsts, seconds = self.firsts, self.seconds
+        if self.is_transform:
+            firsts = ut.translate_codes(firsts, ut.UNICODE_MAP_TRANS)
+            seconds = ut.translate_codes(seconds, ut.UNICODE_MAP_TRANS)
+        buffer = write_ktb_columns(firsts, seconds, self.kernings)
+
+        fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(file_path)))
+        try:
+            with os.fdopen(fd, 'wb') as writer:
+                writer.write(buffer)
+                writer.flush()
+                os.fsync(writer.fileno())
+            # mkstemp creates the file private, keep the permissions of the file being replaced
+            if os.path.exists(file_path):
+                shutil.copymode(file_path, temp_path)
+            os.replace(temp_path, file_path)
+        except OSError:
+            os.remove(temp_path)
+            raise
+
+def scale_kerning(kerning):
+    MULTIPLIER = 1
+    new_kerning = round(int(kerning) / MULTIPLIER)
+    if new_kerning == 0:
+        if kerning > 0:
+            new_kerning = 1
+        elif kerning < 0:
+            new_kerning = -1
+    return new_kerning
+
+class JsonImporter(QThread):
+    progress = pyqtSignal(int)
+    imported = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, file_path):
+        super().__init__()
+        self.file_path = file_path
+
+    def run(self):
+        try:
+            self.imported.emit(self.parse_json(self.file_path))
+        except (OSError, ValueError, KeyError, TypeError, OverflowError) as e:
+            self.failed.emit(str(e))
+
+    def parse_json(self, file_path):
+        # decode with orjson when it is installed and build the columns here, the GUI adds them in one go
+        with open(file_path, 'rb') as file:
+            raw = file.read()
+        data = orjson.loads(raw) if orjson else json.loads(raw)
+        print(f"Importing {len(data)} entries from {file_path}")
+
+        firsts, seconds, kernings = array('H'), array('H'), array('h')
+        last_emit = 0.0
+        for i, entry in enumerate(data):
+            firsts.append(char_to_code(chr(entry['first_unicode'])))
+            seconds.append(char_to_code(chr(entry['second_unicode'])))
+            kernings.append(scale_kerning(entry['amount']))
+            now = time.monotonic()
+            if now - last_emit >= self.PROGRESS_INTERVAL:
+                self.progress.emit(int(i / len(data) * 100))
+                last_emit = now
+        self.progress.emit(100)
+        return firsts, seconds, kernings
+
+class JsonExporter(QThread):
+    exported = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_path, firsts, seconds, kernings):
+        super().__init__()
+        self.file_path = file_path
+        # copies, so edits made while exporting don't change the file
+        self.firsts, self.seconds, self.kernings = array('H', firsts), array('H', seconds), array('h', kernings)
+
+    def run(self):
+        data = [{'amount': kerning, 'first_unicode': first, 'second_unicode': second}
+                for first, second, kerning in zip(self.firsts, self.seconds, self.kernings)]
+        try:
+            # json keeps the indent=4 layout, which orjson cannot produce
+            with open(self.file_path, 'w') as file:
+                file.write(json.dumps(data, ensure_ascii=False, indent=4))
+        except OSError as e:
+            self.failed.emit(str(e))
+            return
+        self.exported.emit(len(data))
 
 class KTBParserGUI(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.model = KerningTableModel(self)
+        self.proxyModel = KerningFilterProxyModel(self)
+        self.proxyModel.setSourceModel(self.model)
+        # keep the filter in step with rows added or replaced while it is active
+        self.model.rowsInserted.connect(lambda *args: self.applyFilter())
+        self.model.modelReset.connect(lambda: self.applyFilter())
+        self.model.duplicatesChanged.connect(self.duplicatesChanged)
         self.initUI()
-        self.kerning_list = []
         self.current_file_path = None
+        self.saveThread = None
 
     def initUI(self):
         self.setWindowTitle('KTB Parser - untitled.ktb')
@@ -145,6 +498,12 @@ class KTBParserGUI(QMainWindow):
         sortAction.triggered.connect(self.sortTable)
         fileMenu.addAction(sortAction)
 
+        # Show only duplicated pairs
+        self.showDuplicatesAction = QAction('Show All Duplicates', self)
+        self.showDuplicatesAction.setCheckable(True)
+        self.showDuplicatesAction.triggered.connect(self.showDuplicates)
+        fileMenu.addAction(self.showDuplicatesAction)
+
         # Duplicate row action
         duplicateRowAction = QAction('Duplicate Row', self)
         duplicateRowAction.setFont(font)
@@ -152,16 +511,15 @@ class KTBParserGUI(QMainWindow):
         duplicateRowAction.triggered.connect(self.duplicateSelectedRow)
         self.addAction(duplicateRowAction)
 
-        # Table widget to display kerning data
-        self.tableWidget = DraggableTableWidget()
-        self.tableWidget.setFont(font)
-        self.tableWidget.setColumnCount(3)
-        self.tableWidget.setHorizontalHeaderLabels(['First Character', 'Second Character', 'Kerning'])
+        # Table view to display kerning data
+        self.tableView = DraggableTableView()
+        self.tableView.setFont(font)
+        self.tableView.setModel(self.proxyModel)
         # set column to fill the space equally
-        for i in range(3): self.tableWidget.horizontalHeader().setSectionResizeMode(i, 1)
-        self.tableWidget.horizontalHeader().setFont(font)
-        self.tableWidget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tableWidget.customContextMenuRequested.connect(self.showContextMenu)
+        for i in range(3): self.tableView.horizontalHeader().setSectionResizeMode(i, 1)
+        self.tableView.horizontalHeader().setFont(font)
+        self.tableView.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tableView.customContextMenuRequested.connect(self.showContextMenu)
 
         # Search bar and combo box for column selection
         self.searchBar = QLineEdit()
@@ -173,10 +531,7 @@ class KTBParserGUI(QMainWindow):
         self.searchComboBox.setStyleSheet("QComboBox { padding: 5px 10px; } QComboBox QAbstractItemView::item { height: 30px; }")
         self.searchComboBox.setItemDelegate(QStyledItemDelegate())
         self.searchComboBox.addItems(["First Character", "Second Character", "Kerning"])
-
-        # Connect the itemChanged signal to the checkForDuplicates method
-        self.tableWidget.itemChanged.connect(self.checkForDuplicates)
-        self.tableWidget.itemChanged.connect(self.checkUnicode)
+        self.searchComboBox.currentIndexChanged.connect(lambda index: self.applyFilter())
 
         # Add row button
         self.addRowButton = QPushButton('Add Row')
@@ -213,7 +568,7 @@ class KTBParserGUI(QMainWindow):
         # Main layout
         layout = QVBoxLayout()
         layout.addLayout(searchLayout)
-        layout.addWidget(self.tableWidget)
+        layout.addWidget(self.tableView)
         layout.addWidget(self.progressBar)
         layout.addLayout(buttonLayout)
         layout.addWidget(self.saveButton)
@@ -233,59 +588,50 @@ class KTBParserGUI(QMainWindow):
     def loadFile(self, file_path):
         self.progressBar.setValue(0)
         self.progressBar.setVisible(True)
+        self.model.setColumns([], [], [])
         self.thread = FileLoader(file_path)
         self.thread.progress.connect(self.updateProgress)
-        self.thread.finished.connect(self.loadTable)
+        self.thread.rowsLoaded.connect(self.appendTableRows)
+        self.thread.finished.connect(self.finishLoading)
+        self.thread.failed.connect(self.loadingFailed)
         self.thread.start()
 
     def updateProgress(self, value):
         self.progressBar.setValue(value)
 
-    def loadTable(self, kerning_list):
-        self.kerning_list = kerning_list
+    def appendTableRows(self, columns):
+        self.model.appendColumns(*columns)
+
+    def finishLoading(self, count):
+        self.progressBar.setVisible(False)
+        self.tableView.scrollToBottom()
+
+    def loadingFailed(self, message):
         self.progressBar.setVisible(False)
-        
-        # Temporarily disconnect the itemChanged signal to prevent it from firing during table population
-        self.tableWidget.itemChanged.disconnect(self.checkForDuplicates)
-        
-        self.tableWidget.setRowCount(len(self.kerning_list))
-        for i, entry in enumerate(self.kerning_list):
-            self.setTableItem(i, 0, entry['first_character'])
-            self.setTableItem(i, 1, entry['second_character'])
-            self.setTableItem(i, 2, str(entry['kerning']))
-
-        # Reconnect the itemChanged signal after table population
-        self.tableWidget.itemChanged.connect(self.checkForDuplicates)
-        self.tableWidget.scrollToBottom()
+        QMessageBox.warning(self, 'Open failed', f'Could not read {self.current_file_path}: {message}')
+        # nothing was loaded, don't let Save overwrite the file with an empty table
+        self.current_file_path = None
+        self.setWindowTitleWithFilePath()
 
     def addDragButton(self, row):
         button = QPushButton('☰')
         button.setFont(self.font())
         button.pressed.connect(lambda: self.startDrag(row))
-        self.tableWidget.setCellWidget(row, 0, button)
+        self.tableView.setIndexWidget(self.proxyModel.mapFromSource(self.model.index(row, 0)), button)
 
     def startDrag(self, row):
-        self.tableWidget.selectRow(row)
-        drag = QDrag(self.tableWidget)
+        self.tableView.selectRow(self.proxyModel.mapFromSource(self.model.index(row, 0)).row())
+        drag = QDrag(self.tableView)
         mime_data = QMimeData()
         drag.setMimeData(mime_data)
         drag.exec_(Qt.MoveAction)
 
-    def setTableItem(self, row, column, text):
-        item = UnicodeTableWidgetItem(text) if column in [0, 1] else QTableWidgetItem(text)
-        item.setFont(self.font())
-        item.setTextAlignment(Qt.AlignCenter)
-        self.tableWidget.setItem(row, column, item)
-
     def saveFile(self):
         if self.current_file_path:
             reply = QMessageBox.question(self, 'Save File', 'Do you want to save over the original file?',
                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
-                self.collectTableData()
                 self.save_ktb(self.current_file_path)
-                self.setWindowTitleWithFilePath()
-                QMessageBox.information(self, "Saved", "File saved successfully")
             else:
                 self.saveFileAsDialog()
         else:
@@ -295,124 +641,63 @@ class KTBParserGUI(QMainWindow):
         options = QFileDialog.Options()
         filePath, _ = QFileDialog.getSaveFileName(self, 'Save KTB File As', '', 'KTB Files (*.ktb);;All Files (*)', options=options)
         if filePath:
-            self.collectTableData()
             self.save_ktb(filePath)
-            self.current_file_path = filePath
-            self.setWindowTitleWithFilePath()
-            QMessageBox.information(self, "Saved", "File saved successfully")
 
     def addRow(self):
-        selected_row = self.tableWidget.currentRow()
-        is_last_row = selected_row == self.tableWidget.rowCount() - 1
+        selected_row = self.tableView.sourceRow(self.tableView.currentIndex())
+        is_last_row = selected_row == self.model.rowCount() - 1
         if selected_row == -1:
             # If no row is selected, add the row at the bottom
-            rowPosition = self.tableWidget.rowCount()
+            rowPosition = self.model.rowCount()
         else:
             # Insert the new row after the selected row
             rowPosition = selected_row + 1
-            
-        self.tableWidget.insertRow(rowPosition)
-        self.kerning_list.insert(rowPosition, {'first_character': '', 'second_character': '', 'kerning': 0})
-        self.setTableItem(rowPosition, 0, '')
-        self.setTableItem(rowPosition, 1, '')
-        self.setTableItem(rowPosition, 2, '0')
+
+        self.model.insertPair(rowPosition, 0, 0, 0)
         if is_last_row:
-            self.tableWidget.scrollToBottom()
+            self.tableView.scrollToBottom()
 
     def deleteRow(self):
-        selected_row = self.tableWidget.currentRow()
+        selected_row = self.tableView.sourceRow(self.tableView.currentIndex())
         if selected_row >= 0:
-            self.tableWidget.removeRow(selected_row)
-            del self.kerning_list[selected_row]
-
-    def checkForDuplicates(self, item):
-        if item.column() in [0, 1]:  # Check only if the changed item is in the first or second character column
-            row = item.row()
-            
-            first_char_item = self.tableWidget.item(row, 0)
-            second_char_item = self.tableWidget.item(row, 1)
-
-            # Ensure both items are created
-            if first_char_item is None:
-                first_char_item = QTableWidgetItem('')
-                self.tableWidget.setItem(row, 0, first_char_item)
-            if second_char_item is None:
-                second_char_item = QTableWidgetItem('')
-                self.tableWidget.setItem(row, 1, second_char_item)
-
-            first_char = first_char_item.text() if first_char_item else ''
-            second_char = second_char_item.text() if second_char_item else ''
-            
-            duplicate_found = False
-            for r in range(self.tableWidget.rowCount()):
-                if r != row:
-                    existing_first_char = self.tableWidget.item(r, 0).text() if self.tableWidget.item(r, 0) else ''
-                    existing_second_char = self.tableWidget.item(r, 1).text() if self.tableWidget.item(r, 1) else ''
-                    if first_char == existing_first_char and second_char == existing_second_char:
-                        duplicate_found = True
-                        break
-            
-            color = QColor(Qt.red) if duplicate_found else QColor(Qt.white)
-            self.tableWidget.item(row, 0).setBackground(color)
-            self.tableWidget.item(row, 1).setBackground(color)
+            self.model.removeRow(selected_row)
 
     def save_ktb(self, file_path, is_transform: bool = True):
-        def write_int(value, num_bytes):
-            return value.to_bytes(num_bytes, byteorder='little', signed=True)
-
-        def write_utf16(value, num_bytes):
-            return value.encode('utf-16le')
-
-        with open(file_path, 'wb') as writer:
-            count = len(self.kerning_list)
-            writer.write(write_int(count, 2))
-
-            if is_transform:
-                for entry in self.kerning_list:
-                    try:
-                        writer.write(write_utf16(ut.UNICODE_MAP[entry['first_character']], 2))
-                    except KeyError:
-                        writer.write(write_utf16(entry['first_character'], 2))
-                    try:
-                        writer.write(write_utf16(ut.UNICODE_MAP[entry['second_character']], 2))
-                    except KeyError:
-                        writer.write(write_utf16(entry['second_character'], 2))
-                    writer.write(write_int(entry['kerning'], 2))
-            else:
-                for entry in self.kerning_list:
-                    writer.write(write_utf16(entry['first_character'], 2))
-                    writer.write(write_utf16(entry['second_character'], 2))
-                    writer.write(write_int(entry['kerning'], 2))
-
-    def collectTableData(self):
-        self.kerning_list = []
-        for row in range(self.tableWidget.rowCount()):
-            first_character = self.tableWidget.item(row, 0).text() if self.tableWidget.item(row, 0) else ''
-            second_character = self.tableWidget.item(row, 1).text() if self.tableWidget.item(row, 1) else ''
-            kerning = int(self.tableWidget.item(row, 2).text()) if self.tableWidget.item(row, 2) else 0
-            self.kerning_list.append({
-                'first_character': first_character,
-                'second_character': second_character,
-                'kerning': kerning
-            })
+        # the model columns are already in file order, they are written on a worker thread
+        if self.saveThread is not None and self.saveThread.isRunning():
+            self.saveThread.wait()
+        self.saveThread = FileSaver(file_path, self.model.firsts, self.model.seconds, self.model.kernings, is_transform)
+        self.saveThread.saved.connect(self.finishSaving)
+        self.saveThread.failed.connect(lambda message: QMessageBox.warning(self, 'Save failed', message))
+        self.saveThread.start()
+
+    def finishSaving(self, file_path):
+        self.current_file_path = file_path
+        self.setWindowTitleWithFilePath()
+        QMessageBox.information(self, "Saved", "File saved successfully")
 
     def searchTable(self, text: str):
-        search_column = self.searchComboBox.currentIndex()
-
-        if text.startswith("0x") and len(text) == 6:
-            try:
-                text = chr(int(text, 16))
-                self.searchBar.setText(text)
-            except ValueError:
-                text = ''
-
-        for row in range(self.tableWidget.rowCount()):
-            item = self.tableWidget.item(row, search_column)
-            if item and text.lower() in item.text().lower():
-                self.tableWidget.showRow(row)
-            else:
-                self.tableWidget.hideRow(row)
-
+        self.applyFilter()
+
+    def showDuplicates(self, checked):
+        self.applyFilter()
+
+    def duplicatesChanged(self):
+        # rows that became or stopped being duplicates move in and out of the duplicates view
+        if self.showDuplicatesAction.isChecked():
+            self.applyFilter()
+
+    def applyFilter(self):
+        # combine the search and the duplicates filter into one set of visible row ids
+        text = self.searchBar.text()
+        ids = None
+        if text:
+            ids = self.model.searchIds(self.searchComboBox.currentIndex(), text)
+        if self.showDuplicatesAction.isChecked():
+            duplicates = self.model.duplicateIds()
+            ids = duplicates if ids is None else ids & duplicates
+        if ids is not None or self.proxyModel.accepted_ids is not None:
+            self.proxyModel.setAcceptedIds(ids)
 
     def importJsonFileDialog(self):
         options = QFileDialog.Options()
@@ -421,35 +706,29 @@ class KTBParserGUI(QMainWindow):
             self.importJsonFile(filePath)
 
     def importJsonFile(self, file_path):
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-            print(f"Importing {len(data)} entries from {file_path}")
-            for entry in data:
-                first_character = chr(entry['first_unicode'])
-                second_character = chr(entry['second_unicode'])
-                kerning = entry['amount']
-                self.appendRow(first_character, second_character, kerning)
-            print(f"Imported {len(data)} entries")
+        self.progressBar.setValue(0)
+        self.progressBar.setVisible(True)
+        self.jsonThread = JsonImporter(file_path)
+        self.jsonThread.progress.connect(self.updateProgress)
+        self.jsonThread.imported.connect(self.finishImport)
+        self.jsonThread.failed.connect(lambda message: self.jsonFailed('Import failed', message))
+        self.jsonThread.start()
+
+    def finishImport(self, columns):
+        # every imported row is added in a single model update
+        self.model.appendColumns(*columns)
+        self.progressBar.setVisible(False)
+        self.tableView.scrollToBottom()
+        print(f"Imported {len(columns[2])} entries")
+
+    def jsonFailed(self, title, message):
+        self.progressBar.setVisible(False)
+        QMessageBox.warning(self, title, message)
 
     def appendRow(self, first_character, second_character, kerning):
-        MULTIPLIER = 1
-        new_kerning = round(int(kerning) / MULTIPLIER)
-        if new_kerning == 0:
-            if kerning > 0:
-                new_kerning = 1
-            elif kerning < 0:
-                new_kerning = -1
-        rowPosition = self.tableWidget.rowCount()
-        self.tableWidget.insertRow(rowPosition)
-        self.setTableItem(rowPosition, 0, first_character)
-        self.setTableItem(rowPosition, 1, second_character)
-        self.setTableItem(rowPosition, 2, str(new_kerning))
-        self.kerning_list.append({
-            'first_character': first_character,
-            'second_character': second_character,
-            'kerning': new_kerning
-        })
-        self.tableWidget.scrollToBottom()
+        rowPosition = self.model.rowCount()
+        self.model.insertPair(rowPosition, char_to_code(first_character), char_to_code(second_character), scale_kerning(kerning))
+        self.tableView.scrollToBottom()
 
     def exportJsonFileDialog(self):
         options = QFileDialog.Options()
@@ -458,60 +737,43 @@ class KTBParserGUI(QMainWindow):
             self.exportJsonFile(filePath)
 
     def exportJsonFile(self, file_path):
-        data = []
-        for entry in self.kerning_list:
-            data.append({
-                'amount': entry['kerning'],
-                'first_unicode': ord(entry['first_character']),
-                'second_unicode': ord(entry['second_character'])
-            })
-        with open(file_path, 'w') as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
-        QMessageBox.information(self, "Exported", "File exported successfully")
+        self.exportThread = JsonExporter(file_path, self.model.firsts, self.model.seconds, self.model.kernings)
+        self.exportThread.exported.connect(lambda count: QMessageBox.information(self, "Exported", "File exported successfully"))
+        self.exportThread.failed.connect(lambda message: self.jsonFailed('Export failed', message))
+        self.exportThread.start()
 
     def closeFile(self):
-        self.tableWidget.setRowCount(0)
-        self.kerning_list = []
+        self.model.setColumns([], [], [])
         self.current_file_path = None
         self.setWindowTitleWithFilePath()
         QMessageBox.information(self, "Closed", "File closed successfully")
 
-    def checkUnicode(self, item):
-        text = item.text()
-        if text.startswith("0x"):
-            try:
-                text = chr(int(text, 16))
-            except ValueError:
-                text = ''
-            item.setText(text)
-        else:
-            item.setText(text)
-    
     def showContextMenu(self, position):
         contextMenu = QMenu(self)
         duplicateAction = contextMenu.addAction("Duplicate Row")
         duplicateAction.setShortcut("Ctrl+D")
-        action = contextMenu.exec_(self.tableWidget.viewport().mapToGlobal(position))
+        action = contextMenu.exec_(self.tableView.viewport().mapToGlobal(position))
         if action == duplicateAction:
-            self.duplicateRow(self.tableWidget.indexAt(position).row())
+            self.duplicateRow(self.tableView.sourceRow(self.tableView.indexAt(position)))
 
     def duplicateRow(self, row):
         if row < 0:
             return
-        first_character = self.tableWidget.item(row, 0).text()
-        second_character = self.tableWidget.item(row, 1).text()
-        kerning = self.tableWidget.item(row, 2).text()
-        self.appendRow(first_character, second_character, int(kerning))
+        first_character = self.model.text(row, 0)
+        second_character = self.model.text(row, 1)
+        kerning = self.model.kernings[row]
+        self.appendRow(first_character, second_character, kerning)
 
     def duplicateSelectedRow(self):
-        selected_row = self.tableWidget.currentRow()
+        selected_row = self.tableView.sourceRow(self.tableView.currentIndex())
         self.duplicateRow(selected_row)
 
     def sortTable(self):
-        self.collectTableData()
-        self.kerning_list.sort(key=lambda x: (ord(x['first_character']) if x['first_character'] else -1,
-                                            ord(x['second_character']) if x['second_character'] else -1))
-        self.loadTable(self.kerning_list)
+        model = self.model
+        order = sorted(range(model.rowCount()), key=lambda r: (model.firsts[r] if model.firsts[r] else -1,
+                                                                model.seconds[r] if model.seconds[r] else -1))
+        model.setColumns([model.firsts[r] for r in order], [model.seconds[r] for r in order], [model.kernings[r] for r in order])
+        self.tableView.scrollToBottom()
 
     def setWindowTitleWithFilePath(self):
         if self.current_file_path:
@@ -0,0 +1,87 @@
+class SkylinePacker:
+	# Bottom-left skyline rectangle packer for one texture page.
+	# The skyline is a list of [x, y, width] segments covering the page width from left to right.
+	def __init__(self, width: int, height: int, padding: int = 1):
+		self.width = width
+		self.height = height
+		self.padding = padding
+		self.skyline = [[0, 0, width]]
+
+	def _fit(self, index: int, width: int, height: int) -> int:
+		# y where a width x height rectangle can sit starting at segment index, or -1
+		x = self.skyline[index][0]
+		if x + width > self.width:
+			return -1
+		y = 0
+		width_left = width
+		while width_left > 0:
+			y = max(y, self.skyline[index][1])
+			if y + height > self.height:
+				return -1
+			width_left -= self.skyline[index][2]
+			index += 1
+		return y
+
+	def _add(self, index: int, x: int, y: int, width: int, height: int):
+		self.skyline.insert(index, [x, y + height, width])
+
+		# shrink or drop the segments now covered by the new one
+		i = index + 1
+		while i < len(self.skyline):
+			previous, current = self.skyline[i - 1], self.skyline[i]
+			shrink = previous[0] + previous[2] - current[0]
+			if shrink <= 0:
+				break
+			current[0] += shrink
+			current[2] -= shrink
+			if current[2] > 0:
+				break
+			del self.skyline[i]
+
+		# merge neighbours at the same height
+		i = 0
+		while i < len(self.skyline) - 1:
+			if self.skyline[i][1] == self.skyline[i + 1][1]:
+				self.skyline[i][2] += self.skyline[i + 1][2]
+				del self.skyline[i + 1]
+			else:
+				i += 1
+
+	def insert(self, width: int, height: int) -> "tuple[int, int] | None":
+		# place a rectangle and return its (x, y), None when the page is full
+		width += self.padding
+		height += self.padding
+		best = None
+		for i in range(len(self.skyline)):
+			y = self._fit(i, width, height)
+			if y < 0:
+				continue
+			# lowest top edge first, then the narrowest segment
+			score = (y + height, self.skyline[i][2])
+			if best is None or score < best[0]:
+				best = (score, i, self.skyline[i][0], y)
+		if best is None:
+			return None
+		_, index, x, y = best
+		self._add(index, x, y, width, height)
+		return x, y
+
+def pack(sizes: "list[tuple[int, int]]", page_width: int, page_height: int, padding: int = 1) -> "list[tuple[int, int, int]]":
+	# place every (width, height) on as few pages as possible, returns (page, x, y) in input order
+	placements = [None] * len(sizes)
+	pages = []
+	# taller rectangles first keeps the skyline flat
+	for i in sorted(range(len(sizes)), key=lambda i: (sizes[i][1], sizes[i][0]), reverse=True):
+		width, height = sizes[i]
+		if width + padding > page_width or height + padding > page_height:
+			raise ValueError(f"{width}x{height} does not fit on a {page_width}x{page_height} page")
+		for page, packer in enumerate(pages):
+			position = packer.insert(width, height)
+			if position:
+				break
+		else:
+			pages.append(SkylinePacker(page_width, page_height, padding))
+			page = len(pages) - 1
+			position = pages[page].insert(width, height)
+		placements[i] = (page, *position)
+	return placements
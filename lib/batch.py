@@ -0,0 +1,32 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+def _timed(function, args: tuple) -> "tuple[float, object]":
+	start = time.perf_counter()
+	result = function(*args)
+	return time.perf_counter() - start, result
+
+def run_batch(function, tasks: "list[tuple[str, tuple]]", workers: int = None, done=None):
+	# Run function(*args) for every (name, args) task on a process pool and print how long each file took.
+	# function has to be a module level function so the workers can import it.
+	# done(name, result) is called in this process for every task that succeeded.
+	workers = workers or os.cpu_count()
+	failed = []
+	start = time.perf_counter()
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		futures = {pool.submit(_timed, function, args): name for name, args in tasks}
+		for future in as_completed(futures):
+			name = futures[future]
+			try:
+				elapsed, result = future.result()
+			except Exception as e:
+				print(f"Failed {name}: {e}")
+				failed.append(name)
+				continue
+			print(f"Processed {name} in {elapsed * 1000:.0f}ms")
+			if done:
+				done(name, result)
+	print(f"Processed {len(tasks) - len(failed)}/{len(tasks)} files in {time.perf_counter() - start:.2f}s ({workers} workers)")
+	if failed:
+		raise RuntimeError(f"{len(failed)} files failed: {', '.join(sorted(failed))}")
@@ -0,0 +1,129 @@
+import struct
+import sys
+from array import array
+
+# KTB: uint16 pair count, then (left, right, amount) pairs.
+# Characters are unsigned code points, the kerning amount is signed.
+KTB_COUNT = struct.Struct("<H")
+KTB_PAIR = struct.Struct("<HHh")
+
+# FTB glyph records: unicode, texId, width, height, u, v (all unsigned)
+FTB_GLYPH = struct.Struct("<6H")
+FTB_FIELDS = ("unicode", "texId", "width", "height", "u", "v")
+
+def read_ktb(data: bytes) -> "list[tuple[int, int, int]]":
+	# decode every (left, right, amount) pair of a .ktb file in one pass
+	if len(data) < KTB_COUNT.size:
+		raise ValueError("Invalid file")
+	count, = KTB_COUNT.unpack_from(data)
+	end = KTB_COUNT.size + count * KTB_PAIR.size
+	if len(data) < end:
+		raise ValueError("Invalid file")
+	return list(KTB_PAIR.iter_unpack(memoryview(data)[KTB_COUNT.size:end]))
+
+def write_ktb(pairs: "list[tuple[int, int, int]]") -> bytearray:
+	# encode pairs into one preallocated buffer, count header included
+	buffer = bytearray(KTB_COUNT.size + len(pairs) * KTB_PAIR.size)
+	KTB_COUNT.pack_into(buffer, 0, len(pairs))
+	offset = KTB_COUNT.size
+	for pair in pairs:
+		try:
+			KTB_PAIR.pack_into(buffer, offset, *pair)
+		except struct.error:
+			raise ValueError(f"Invalid kerning pair {pair}")
+		offset += KTB_PAIR.size
+	return buffer
+
+def read_ktb_columns(data: bytes) -> "tuple[array, array, array]":
+	# left and right as uint16 arrays, amount as an int16 array, without building a tuple per pair
+	if len(data) < KTB_COUNT.size:
+		raise ValueError("Invalid file")
+	count, = KTB_COUNT.unpack_from(data)
+	end = KTB_COUNT.size + count * KTB_PAIR.size
+	if len(data) < end:
+		raise ValueError("Invalid file")
+	table = array("H")
+	table.frombytes(data[KTB_COUNT.size:end])
+	if sys.byteorder == "big":
+		table.byteswap()
+	amounts = array("h")
+	amounts.frombytes(table[2::3].tobytes())
+	return table[0::3], table[1::3], amounts
+
+def write_ktb_columns(lefts: array, rights: array, amounts: array) -> bytearray:
+	# interleave uint16 left/right and int16 amount columns back into a .ktb buffer
+	count = len(lefts)
+	table = array("H", bytes(count * KTB_PAIR.size))
+	table[0::3] = lefts
+	table[1::3] = rights
+	table[2::3] = array("H", amounts.tobytes())
+	if sys.byteorder == "big":
+		table.byteswap()
+	buffer = bytearray(KTB_COUNT.size + count * KTB_PAIR.size)
+	KTB_COUNT.pack_into(buffer, 0, count)
+	buffer[KTB_COUNT.size:] = table.tobytes()
+	return buffer
+
+def read_ftb_glyphs(data: bytes) -> array:
+	# flat uint16 table, FTB_FIELDS values per glyph
+	table = array("H")
+	table.frombytes(data)
+	if sys.byteorder == "big":
+		table.byteswap()
+	return table
+
+def write_ftb_glyphs(table: array) -> bytes:
+	if sys.byteorder == "big":
+		table = array("H", table)
+		table.byteswap()
+	return table.tobytes()
+
+def char_to_code(char: str) -> int:
+	# KTB characters are single UTF-16 code units, empty cells are stored as 0 and "0x0e01" is read as hex
+	if char.startswith("0x"):
+		char = chr(int(char, 16))
+	if not char:
+		return 0
+	if len(char) != 1 or ord(char) > 0xffff:
+		raise ValueError(f"'{char}' is not a single UTF-16 character")
+	return ord(char)
+
+# Thaiji lookup table: header, uint16 code per key, uint16 key offsets (count + 1) into the UTF-16 key units.
+# The stamp is the sha1 of the thaiji.csv the table was built from.
+THAIJI_MAGIC = b"THJI"
+THAIJI_VERSION = 1
+THAIJI_HEADER = struct.Struct("<4sHH20s")
+
+def write_thaiji_table(table: "dict[str, int]", stamp: bytes) -> bytes:
+	codes = array("H")
+	offsets = array("H", [0])
+	units = array("H")
+	for key, code in table.items():
+		# offsets index characters, so keys have to be BMP only
+		if any(ord(c) > 0xffff for c in key):
+			raise ValueError(f"'{key}' is not a BMP string")
+		codes.append(code)
+		units.extend(ord(c) for c in key)
+		offsets.append(len(units))
+	for column in (codes, offsets, units):
+		if sys.byteorder == "big":
+			column.byteswap()
+	header = THAIJI_HEADER.pack(THAIJI_MAGIC, THAIJI_VERSION, len(codes), stamp)
+	return header + codes.tobytes() + offsets.tobytes() + units.tobytes()
+
+def read_thaiji_table(data: bytes) -> "tuple[bytes, dict[str, int]]":
+	# returns (stamp, key -> code) in the order the table was written
+	if len(data) < THAIJI_HEADER.size:
+		raise ValueError("Invalid thaiji table")
+	magic, version, count, stamp = THAIJI_HEADER.unpack_from(data)
+	if magic != THAIJI_MAGIC or version != THAIJI_VERSION:
+		raise ValueError("Invalid thaiji table")
+	columns = array("H")
+	columns.frombytes(data[THAIJI_HEADER.size:])
+	if sys.byteorder == "big":
+		columns.byteswap()
+	codes, offsets, units = columns[:count], columns[count:count * 2 + 1], columns[count * 2 + 1:]
+	if len(offsets) != count + 1 or offsets[-1] != len(units):
+		raise ValueError("Invalid thaiji table")
+	keys = units.tobytes().decode("utf-16-le" if sys.byteorder == "little" else "utf-16-be")
+	return stamp, {keys[offsets[i]:offsets[i + 1]]: codes[i] for i in range(count)}
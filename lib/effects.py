@@ -0,0 +1,68 @@
+from PIL import Image, ImageChops, ImageFilter
+
+# Glyph post-processing on whole channels, configured per font as a list of {"type": name, **params}.
+
+def _scaled(alpha: Image.Image, opacity: int) -> Image.Image:
+	if opacity >= 255:
+		return alpha
+	return alpha.point(lambda value: value * opacity // 255)
+
+def alpha_to_rgb(image: Image.Image) -> Image.Image:
+	# copy the alpha channel into r, g and b
+	alpha = image.getchannel("A")
+	return Image.merge("RGBA", (alpha, alpha, alpha, alpha))
+
+def premultiply(image: Image.Image) -> Image.Image:
+	r, g, b, a = image.split()
+	return Image.merge("RGBA", (ImageChops.multiply(r, a), ImageChops.multiply(g, a), ImageChops.multiply(b, a), a))
+
+def trim(image: Image.Image, axes: str = "xy", padding: int = 0) -> Image.Image:
+	# crop to the drawn pixels along the given axes, keeping padding pixels around them
+	bbox = image.getchannel("A").getbbox()
+	if bbox is None:
+		return image
+	left, top, right, bottom = 0, 0, image.width, image.height
+	if "x" in axes:
+		left, right = max(bbox[0] - padding, 0), min(bbox[2] + padding, image.width)
+	if "y" in axes:
+		top, bottom = max(bbox[1] - padding, 0), min(bbox[3] + padding, image.height)
+	return image.crop((left, top, right, bottom))
+
+def shadow(image: Image.Image, offset: "tuple[int, int]" = (1, 1), color: "tuple[int, int, int, int]" = (0, 0, 0, 255), blur: float = 0) -> Image.Image:
+	# the glyph's alpha moved by offset and drawn in color behind it
+	shifted = Image.new("L", image.size, 0)
+	shifted.paste(_scaled(image.getchannel("A"), color[3]), tuple(offset))
+	if blur:
+		shifted = shifted.filter(ImageFilter.GaussianBlur(blur))
+	layer = Image.new("RGBA", image.size, tuple(color[:3]) + (0,))
+	layer.putalpha(shifted)
+	return Image.alpha_composite(layer, image)
+
+def outline(image: Image.Image, width: int = 1, color: "tuple[int, int, int, int]" = (0, 0, 0, 255)) -> Image.Image:
+	# the glyph's alpha grown by width pixels and drawn in color behind it
+	grown = image.getchannel("A").filter(ImageFilter.MaxFilter(width * 2 + 1))
+	layer = Image.new("RGBA", image.size, tuple(color[:3]) + (0,))
+	layer.putalpha(_scaled(grown, color[3]))
+	return Image.alpha_composite(layer, image)
+
+def crop(image: Image.Image, left: int = 0, top: int = 0, right: int = 0, bottom: int = 0) -> Image.Image:
+	# remove a fixed number of pixels from each edge
+	return image.crop((left, top, image.width - right, image.height - bottom))
+
+EFFECTS = {
+	"alpha_to_rgb": alpha_to_rgb,
+	"premultiply": premultiply,
+	"trim": trim,
+	"shadow": shadow,
+	"outline": outline,
+	"crop": crop,
+}
+
+def apply_effects(image: Image.Image, effects: "list[dict]") -> Image.Image:
+	for effect in effects:
+		params = dict(effect)
+		name = params.pop("type")
+		if name not in EFFECTS:
+			raise ValueError(f"Unknown glyph effect '{name}'")
+		image = EFFECTS[name](image, **params)
+	return image
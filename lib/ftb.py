@@ -1,14 +1,34 @@
 import csv
+from array import array
 import lib.unicodetools as ut
+from lib.codec import FTB_FIELDS as FIELDS, FTB_GLYPH, read_ftb_glyphs, write_ftb_glyphs
+
+def _field(index: int):
+	def getter(self):
+		return self._table[self._row + index]
+	def setter(self, value):
+		self._table[self._row + index] = value
+	return property(getter, setter)
 
 class Character:
+	# A view over one row of a glyph table. Characters created directly own a single-row table.
 	def __init__(self, unicode: int, texId: int, width: int, height: int, u: int, v: int):
-		self.unicode = unicode
-		self.texId = texId
-		self.width = width
-		self.height = height
-		self.u = u
-		self.v = v
+		self._table = array("H", (unicode, texId, width, height, u, v))
+		self._row = 0
+
+	@staticmethod
+	def view(table: array, index: int) -> 'Character':
+		char = Character.__new__(Character)
+		char._table = table
+		char._row = index * len(FIELDS)
+		return char
+
+	unicode = _field(0)
+	texId = _field(1)
+	width = _field(2)
+	height = _field(3)
+	u = _field(4)
+	v = _field(5)
 
 	def swap_info(self, char: 'Character'):
 		# swap everything except unicode
@@ -32,16 +52,10 @@ class File:
 			f.seek(0x80)
 			file.chars_offset = int.from_bytes(f.read(4), "little")
 
-			file.characters = []
+			# read the whole glyph table at once
 			f.seek(file.chars_offset)
-			for _ in range(file.chars_count):
-				unicode = int.from_bytes(f.read(2), "little")
-				texId = int.from_bytes(f.read(2), "little")
-				width = int.from_bytes(f.read(2), "little")
-				height = int.from_bytes(f.read(2), "little")
-				u = int.from_bytes(f.read(2), "little")
-				v = int.from_bytes(f.read(2), "little")
-				file.characters.append(Character(unicode, texId, width, height, u, v))
+			file.table = read_ftb_glyphs(f.read(file.chars_count * FTB_GLYPH.size))
+			file._characters = None
 
 			# read remaining bytes
 			file.footer = f.read()
@@ -52,12 +66,71 @@ class File:
 
 			return file
 
+	@property
+	def characters(self) -> "list[Character]":
+		# Character objects are only created when someone asks for them
+		if self._characters is None:
+			self._characters = [Character.view(self.table, i) for i in range(len(self.table) // len(FIELDS))]
+		return self._characters
+
+	@characters.setter
+	def characters(self, characters: "list[Character]"):
+		self._characters = characters
+
+	def packed_table(self) -> array:
+		# the glyph table including any edits made through a materialized characters list
+		if self._characters is None:
+			return self.table
+		table = array("H")
+		for char in self._characters:
+			table.extend(char._table[char._row:char._row + len(FIELDS)])
+		return table
+
+	def _repack(self, characters: "list[Character]"):
+		# build the table from characters in order and point every one of them at its new row,
+		# so Character objects the caller holds keep editing the table
+		width = len(FIELDS)
+		table = array("H")
+		for char in characters:
+			table.extend(char._table[char._row:char._row + width])
+		for i, char in enumerate(characters):
+			char._table = table
+			char._row = i * width
+		self.table = table
+		self._characters = characters
+
 	def tranform_thai(self):
-		for char in self.characters:
-			if (char.unicode >= 3585 and char.unicode <= 3675) or (char.unicode >= 63232 and char.unicode <= 63258):
-				char.unicode = ut.UNICODE_MAP_DEC[char.unicode]
+		width = len(FIELDS)
+		if self._characters is not None:
+			for char in self._characters:
+				if (char.unicode >= 3585 and char.unicode <= 3675) or (char.unicode >= 63232 and char.unicode <= 63258):
+					char.unicode = ut.UNICODE_MAP_DEC[char.unicode]
+			# sort the existing objects in place
+			self._characters.sort(key=lambda char: char.unicode)
+			self._repack(self._characters)
+			return
+
+		table = self.table
+		unicodes = table[0::width]
+		for i, unicode in enumerate(unicodes):
+			if (unicode >= 3585 and unicode <= 3675) or (unicode >= 63232 and unicode <= 63258):
+				unicodes[i] = ut.UNICODE_MAP_DEC[unicode]
+		table[0::width] = unicodes
+
 		# sort by unicode
-		self.characters.sort(key=lambda char: char.unicode)
+		self.table = array("H")
+		for i in sorted(range(len(unicodes)), key=unicodes.__getitem__):
+			self.table.extend(table[i * width:(i + 1) * width])
+
+	def replace_characters(self, characters: "list[Character]"):
+		# replace glyphs with the same unicode and add new ones, keep the table sorted and the header count in sync
+		rows = {char.unicode: char for char in self.characters}
+		for char in characters:
+			rows[char.unicode] = char
+		self._repack([rows[unicode] for unicode in sorted(rows)])
+
+		self.chars_count = len(rows)
+		self.header = self.header[:0x7a] + self.chars_count.to_bytes(2, "little") + self.header[0x7c:]
 
 	# for testing purposes
 	def to_csv(self, output_path: str):
@@ -67,25 +140,10 @@ class File:
 			for char in self.characters:
 				writer.writerow([char.unicode, chr(char.unicode), char.texId, char.width, char.height, char.u, char.v])
 
+	def to_bytes(self) -> bytes:
+		# header, characters, footer
+		return self.header + write_ftb_glyphs(self.packed_table()) + self.footer
+
 	def rewrite(self, path):
 		with open(path, "wb") as f:
-			# write header
-			f.write(self.header)
-
-			# write characters
-			for char in self.characters:
-				f.write(char.unicode.to_bytes(2, "little"))
-				f.write(char.texId.to_bytes(2, "little"))
-				f.write(char.width.to_bytes(2, "little"))
-				f.write(char.height.to_bytes(2, "little"))
-				f.write(char.u.to_bytes(2, "little"))
-				f.write(char.v.to_bytes(2, "little"))
-
-			# write footer
-			f.write(self.footer)
-
-if __name__ == "__main__":
-	ftb_path = "C:/Users/modda/OneDrive/Documents/OmegaT Project/assembly/font/font_11.dat/font_11.ftb"
-	result = File.parse(ftb_path)
-	# result.tranform_thai()
-	# result.rewrite("C:/Users/modda/OneDrive/Documents/OmegaT Project/assembly/font/font_11.dat/font_11_test.ftb")
\ No newline at end of file
+			f.write(self.to_bytes())
@@ -1,18 +1,15 @@
-import unicodetools as ut
+import mmap
+import sys
+import lib.unicodetools as ut
+from lib.codec import KTB_COUNT, KTB_PAIR, read_ktb, write_ktb
 
 class File:
 	@staticmethod
 	def parse(path):
 		with open(path, "rb") as f:
 			file = File()
-			file.pairs_amount = int.from_bytes(f.read(2), "little")
-
-			file.pairs = []
-			for _ in range(file.pairs_amount):
-				left = int.from_bytes(f.read(2), "little")
-				right = int.from_bytes(f.read(2), "little")
-				amount = int.from_bytes(f.read(2), "little")
-				file.pairs.append({"left": left, "right": right, "amount": amount})
+			file.pairs = [{"left": left, "right": right, "amount": amount} for left, right, amount in read_ktb(f.read())]
+			file.pairs_amount = len(file.pairs)
 			
 			return file
 		
@@ -28,30 +25,129 @@ class File:
 
 		return self
 	
+	def to_bytes(self) -> bytearray:
+		return write_ktb([(pair["left"], pair["right"], pair["amount"]) for pair in self.pairs])
+
 	def rewrite(self, path):
 		with open(path, "wb") as f:
-			f.write(len(self.pairs).to_bytes(2, "little"))
-			for pair in self.pairs:
-				f.write(pair["left"].to_bytes(2, "little"))
-				f.write(pair["right"].to_bytes(2, "little"))
-				f.write(pair["amount"].to_bytes(2, "little"))
+			f.write(self.to_bytes())
 
 	def __str__(self) -> str:
 		return f"File(pairs_amount={self.pairs_amount}, pairs={self.pairs})"
-	
-if __name__ == "__main__":
-	base_path = "C:/Users/modda/OneDrive/Documents/OmegaT Project/unpacked/font"
-	ktb_paths = [
-					f"{base_path}/font_01.dat/font_01.ktb", 
-					f"{base_path}/font_36.dat/font_36.ktb",
-					f"{base_path}/font_04.dat/font_04.ktb",
-					f"{base_path}/font_05.dat/font_05.ktb",
-					f"{base_path}/font_11.dat/font_11.ktb",
-				 ]
-	
-	for ktb_file in ktb_paths:
-		file = File.parse(ktb_file)
-		file.transform_thai()
-		file.rewrite(ktb_file)
-		print(f"Successfully transformed {ktb_file}")
-		# break
\ No newline at end of file
+
+	@staticmethod
+	def map(path) -> 'MappedFile':
+		return MappedFile(path)
+
+class MappedFile:
+	# Memory-mapped .ktb file. Pairs are a (left, right, amount) table read and edited in place,
+	# nothing is decoded until a row is touched.
+	def __init__(self, path):
+		if sys.byteorder != "little":
+			raise OSError("Memory-mapped KTB access needs a little-endian host, use File.parse instead")
+		self._file = open(path, "r+b")
+		self._resized = False
+		self._columns = {}
+		try:
+			self._mmap = mmap.mmap(self._file.fileno(), 0)
+		except ValueError:
+			self._file.close()
+			raise ValueError("Invalid file")
+		if len(self._mmap) < KTB_COUNT.size:
+			self.close()
+			raise ValueError("Invalid file")
+		self.pairs_amount, = KTB_COUNT.unpack_from(self._mmap)
+		end = KTB_COUNT.size + self.pairs_amount * KTB_PAIR.size
+		if len(self._mmap) < end:
+			self.close()
+			raise ValueError("Invalid file")
+		self._view = memoryview(self._mmap)[KTB_COUNT.size:end]
+		# characters are unsigned, the kerning amount is signed
+		self._unsigned = self._view.cast("H")
+		self._signed = self._view.cast("h")
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __len__(self) -> int:
+		return self.pairs_amount
+
+	def _offset(self, index: int) -> int:
+		if not 0 <= index < self.pairs_amount:
+			raise IndexError("pair index out of range")
+		return KTB_COUNT.size + index * KTB_PAIR.size
+
+	def __getitem__(self, index: int) -> "tuple[int, int, int]":
+		return KTB_PAIR.unpack_from(self._mmap, self._offset(index))
+
+	def __setitem__(self, index: int, pair: "tuple[int, int, int]"):
+		KTB_PAIR.pack_into(self._mmap, self._offset(index), *pair)
+
+	def _column(self, index: int) -> memoryview:
+		# One view per column is handed out and released again by delete() and close(),
+		# so a view kept by the caller cannot keep the map open. Using it after that raises ValueError.
+		if index not in self._columns:
+			table = self._signed if index == 2 else self._unsigned
+			self._columns[index] = table[index:self.pairs_amount * 3:3]
+		return self._columns[index]
+
+	def _release_columns(self):
+		for view in self._columns.values():
+			view.release()
+		self._columns = {}
+
+	# columns are strided views, writing to them edits the file
+	@property
+	def left(self) -> memoryview:
+		return self._column(0)
+
+	@property
+	def right(self) -> memoryview:
+		return self._column(1)
+
+	@property
+	def amount(self) -> memoryview:
+		return self._column(2)
+
+	def delete(self, index: int):
+		# shift the following rows down and write the new count, the file is truncated on close
+		offset = self._offset(index)
+		end = KTB_COUNT.size + self.pairs_amount * KTB_PAIR.size
+		self._mmap.move(offset, offset + KTB_PAIR.size, end - offset - KTB_PAIR.size)
+		self.pairs_amount -= 1
+		KTB_COUNT.pack_into(self._mmap, 0, self.pairs_amount)
+		self._resized = True
+		self._release_columns()
+
+	def transform_thai(self):
+		for column in (self.left, self.right):
+			for i, unicode in enumerate(column):
+				if (unicode >= 3585 and unicode <= 3675) or (unicode >= 63232 and unicode <= 63258):
+					column[i] = ut.UNICODE_MAP_DEC[unicode]
+
+		# sort by left then right
+		pairs = sorted(zip(self.left, self.right, self.amount), key=lambda x: (x[0] if x[0] else -1, x[1] if x[1] else -1))
+		self._mmap[KTB_COUNT.size:KTB_COUNT.size + len(pairs) * KTB_PAIR.size] = write_ktb(pairs)[KTB_COUNT.size:]
+
+		return self
+
+	def save(self):
+		KTB_COUNT.pack_into(self._mmap, 0, self.pairs_amount)
+		self._mmap.flush()
+
+	def close(self):
+		if self._mmap.closed:
+			return
+		self._release_columns()
+		if hasattr(self, "_view"):
+			self._unsigned.release()
+			self._signed.release()
+			self._view.release()
+		self._mmap.close()
+		# drop the rows removed with delete()
+		if self._resized:
+			self._file.truncate(KTB_COUNT.size + self.pairs_amount * KTB_PAIR.size)
+		self._file.close()
@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+
+def file_hash(path: str) -> str:
+	digest = hashlib.sha1()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 20), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+def _stat(path: str) -> "list[int]":
+	stat = os.stat(path)
+	return [stat.st_mtime_ns, stat.st_size]
+
+class Manifest:
+	# Output path -> mtime, size and hash of every input it was built from, plus anything the builder wants to keep.
+	# mtime and size are checked first, inputs are only hashed again when those changed.
+	def __init__(self, path: str):
+		self.path = path
+		self.entries = {}
+		if os.path.exists(path):
+			with open(path, "r", encoding="utf-8") as f:
+				self.entries = json.load(f)
+
+	def unchanged(self, output: str, path: str) -> bool:
+		# whether input path is the same as when output was last built
+		entry = self.entries.get(output)
+		if entry is None or path not in entry["inputs"] or not os.path.exists(path):
+			return False
+		recorded = entry["inputs"][path]
+		stat = _stat(path)
+		if stat == recorded["stat"]:
+			return True
+		if file_hash(path) != recorded["hash"]:
+			return False
+		# touched without changes, skip the hash next time
+		recorded["stat"] = stat
+		return True
+
+	def is_fresh(self, output: str, inputs: "list[str]") -> bool:
+		entry = self.entries.get(output)
+		if entry is None or not os.path.exists(output) or sorted(entry["inputs"]) != sorted(inputs):
+			return False
+		return all(self.unchanged(output, path) for path in inputs)
+
+	def get(self, output: str, field: str, default=None):
+		return self.entries.get(output, {}).get(field, default)
+
+	def record(self, output: str, inputs: "list[str]", **fields):
+		self.entries[output] = {"inputs": {path: {"stat": _stat(path), "hash": file_hash(path)} for path in inputs}, **fields}
+
+	def save(self):
+		os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+		with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+			json.dump(self.entries, f, separators=(",", ":"))
+		os.replace(f"{self.path}.tmp", self.path)
@@ -1,3 +1,6 @@
+import sys
+from array import array
+
 UNICODE_MAP = {
 	# Thai to Latin Extended-A
 	"\u0e01": "\u0100",
@@ -119,6 +122,20 @@ UNICODE_MAP = {
 
 UNICODE_MAP_DEC = {ord(k): ord(v) for k, v in UNICODE_MAP.items()}
 
+# inverse maps, Latin Extended-A back to Thai
+UNICODE_MAP_INVERSE = {v: k for k, v in UNICODE_MAP.items()}
+UNICODE_MAP_DEC_INVERSE = {v: k for k, v in UNICODE_MAP_DEC.items()}
+# for str.translate
+UNICODE_MAP_TRANS = str.maketrans(UNICODE_MAP)
+UNICODE_MAP_INVERSE_TRANS = str.maketrans(UNICODE_MAP_INVERSE)
+
+def translate_codes(codes: array, table: dict) -> array:
+	# remap a uint16 array of code points through a str.maketrans table in one call
+	encoding = "utf-16-le" if sys.byteorder == "little" else "utf-16-be"
+	result = array("H")
+	result.frombytes(codes.tobytes().decode(encoding, "surrogatepass").translate(table).encode(encoding, "surrogatepass"))
+	return result
+
 # tranform \uxxxx to \\uxxxx in a loop
 UNICODE_MAP_ESCAPED = {
 	k.encode("unicode-escape").decode("utf-8"): v.encode("unicode-escape").decode("utf-8") for k, v in UNICODE_MAP.items()
@@ -0,0 +1,108 @@
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+from lib import ftb, ktb
+from lib.batch import run_batch
+
+# Headless batch transforms, e.g.
+#   python nier_tools.py ktb transform "unpacked/font/*/*.ktb" --jobs 4
+#   python nier_tools.py ftb transform "assembly/font/*/*.ftb" --dry-run
+
+def convert(kind: str, action: str, path: str) -> bytes:
+	if kind == "ktb":
+		file = ktb.File.parse(path)
+		if action == "transform":
+			file.transform_thai()
+	else:
+		file = ftb.File.parse(path)
+		if action == "transform":
+			file.tranform_thai()
+	return bytes(file.to_bytes())
+
+def process_file(kind: str, action: str, path: str, output_path: str, dry_run: bool = False) -> str:
+	# returns what happened to the file, output is written to a temp file and moved into place
+	data = convert(kind, action, path)
+	if os.path.exists(output_path):
+		with open(output_path, "rb") as f:
+			if f.read() == data:
+				return "unchanged"
+	if dry_run:
+		return f"would write {len(data)} bytes to {output_path}"
+
+	# a unique temp file per write, so workers never share one
+	directory = os.path.dirname(os.path.abspath(output_path))
+	os.makedirs(directory, exist_ok=True)
+	fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+	try:
+		with os.fdopen(fd, "wb") as f:
+			f.write(data)
+		if os.path.exists(output_path):
+			shutil.copymode(output_path, temp_path)
+		os.replace(temp_path, output_path)
+	except OSError:
+		os.remove(temp_path)
+		raise
+	return f"wrote {len(data)} bytes to {output_path}"
+
+def glob_root(pattern: str) -> str:
+	# the directories before the first wildcard, matches keep their path below it in --output-dir
+	parts = []
+	for part in os.path.dirname(pattern).replace("\\", "/").split("/"):
+		if glob.has_magic(part):
+			break
+		parts.append(part)
+	return "/".join(parts)
+
+def expand(patterns: "list[str]") -> "list[tuple[str, str]]":
+	# (path, path relative to its pattern's glob root) for every match
+	paths = []
+	seen = set()
+	for pattern in patterns:
+		matches = sorted(glob.glob(pattern, recursive=True))
+		if not matches:
+			print(f"No files match {pattern}")
+		root = glob_root(pattern)
+		for path in matches:
+			if path not in seen:
+				seen.add(path)
+				paths.append((path, os.path.relpath(path, root or ".")))
+	return paths
+
+def main(argv: "list[str]" = None) -> int:
+	parser = argparse.ArgumentParser(prog="nier-tools", description="Batch transforms for NieR font files")
+	parser.add_argument("kind", choices=["ktb", "ftb"], help="file type")
+	parser.add_argument("action", choices=["transform", "rewrite"], help="transform: remap Thai code points and sort, rewrite: parse and write back unchanged")
+	parser.add_argument("patterns", nargs="+", help="files or glob patterns, ** is supported")
+	parser.add_argument("--jobs", "-j", type=int, default=None, help="worker processes (default: cpu count)")
+	parser.add_argument("--output-dir", "-o", default=None, help="write results here instead of in place")
+	parser.add_argument("--dry-run", "-n", action="store_true", help="report what would change without writing")
+	args = parser.parse_args(argv)
+
+	paths = expand(args.patterns)
+	if not paths:
+		return 1
+
+	tasks = []
+	outputs = {}
+	for path, relative in paths:
+		output_path = os.path.join(args.output_dir, relative) if args.output_dir else path
+		# different patterns can still map two inputs onto the same output
+		key = os.path.normcase(os.path.abspath(output_path))
+		if key in outputs:
+			print(f"{path} and {outputs[key]} would both be written to {output_path}")
+			return 1
+		outputs[key] = path
+		tasks.append((path, (args.kind, args.action, path, output_path, args.dry_run)))
+
+	try:
+		run_batch(process_file, tasks, args.jobs, done=lambda path, result: print(f"  {path}: {result}"))
+	except RuntimeError as e:
+		print(e)
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
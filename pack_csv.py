@@ -1,42 +1,50 @@
 import csv
 import os
+import sys
 from dotenv import load_dotenv
+from lib.batch import run_batch
+from lib.manifest import Manifest
 
 load_dotenv()
 
-def parse_properties(path: str) -> "dict[str, str]":
-	properties = {}
+def iter_properties(path: str) -> "Iterator[tuple[str, str]]":
+	# stream (key, value) pairs without reading the whole file
 	with open(path, "r", encoding="utf-8") as f:
-		for line in f.readlines():
+		for line in f:
 			if line.startswith("#"):
 				continue
 			key, value = line.rstrip("\n").split("=", 1)
-			properties[key] = value
-	return properties
+			yield key, value
+
+def parse_properties(path: str) -> "dict[str, str]":
+	return dict(iter_properties(path))
 
 def pack_csv(output_path: str, eng_path: str, jp_path: str, th_path: str = "") -> None:
-	output_path_base = os.path.dirname(output_path)
-	if not os.path.exists(output_path_base):
-		os.makedirs(output_path_base)
+	# files are written from several processes at once
+	os.makedirs(os.path.dirname(output_path), exist_ok=True)
 	
 	eng_properties = parse_properties(eng_path)
 	jp_properties = parse_properties(jp_path)
 	th_properties = parse_properties(th_path) if th_path else None
 
-	with open(output_path, "w", newline="", encoding="utf-8") as f:
-		writer = csv.writer(f)
-		writer.writerow(["Key", "English", "Japanese", "Thai"])
-		for key in eng_properties:
-			eng_value = eng_properties.get(key)
+	def rows():
+		for key, eng_value in eng_properties.items():
 			jp_value = jp_properties.get(key, "null")
 			th_value = th_properties.get(key, "") if th_properties else ""
 
 			if th_value == eng_value:
 				th_value = ""
 
-			writer.writerow([key, eng_value, jp_value, th_value])
+			yield [key, eng_value, jp_value, th_value]
 
-def main():
+	with open(output_path, "w", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		writer.writerow(["Key", "English", "Japanese", "Thai"])
+		writer.writerows(rows())
+
+MANIFEST_PATH = "output/pack_manifest.json"
+
+def main(workers: int = None, incremental: bool = True):
 	eng_base_path = os.getenv("ENG_BASE_PATH")
 	jp_base_path = os.getenv("JP_BASE_PATH")
 	th_base_path = os.getenv("TH_BASE_PATH")
@@ -44,13 +52,26 @@ def main():
 
 	base_files = [file for file in os.listdir(eng_base_path) if file.endswith(".properties")]
 
+	tasks = []
 	for file in base_files:
-		print(f"Processing {file}...")
 		file_name = file.split(".")[0]
 		if file_name in ["subtitle0482", "messloading", "messending", "g11516_2ccba2ea_scp", "global_638e40c8_scp", "messcore", "messtitle", "messoption", "core_hap", "txt_pause_add", "txt_core_add", "p100_6695192d_scp", "subtitle0170"]:
-			pack_csv(f"{output_base_path}/{file_name}.csv", f"{eng_base_path}/{file}", f"{jp_base_path}/{file}", f"{th_base_path}/{file_name}_th.properties")
+			tasks.append((file, (f"{output_base_path}/{file_name}.csv", f"{eng_base_path}/{file}", f"{jp_base_path}/{file}", f"{th_base_path}/{file_name}_th.properties")))
 		else:
-			pack_csv(f"{output_base_path}/{file_name}.csv", f"{eng_base_path}/{file}", f"{jp_base_path}/{file}")
+			tasks.append((file, (f"{output_base_path}/{file_name}.csv", f"{eng_base_path}/{file}", f"{jp_base_path}/{file}")))
+
+	# with incremental only csv files whose properties changed are rebuilt
+	manifest = Manifest(MANIFEST_PATH)
+	inputs = {file: list(args[1:]) for file, args in tasks}
+	outputs = {file: args[0] for file, args in tasks}
+	if incremental:
+		tasks = [(file, args) for file, args in tasks if not manifest.is_fresh(args[0], inputs[file])]
+		print(f"{len(tasks)}/{len(base_files)} files changed")
+
+	try:
+		run_batch(pack_csv, tasks, workers, done=lambda file, _: manifest.record(outputs[file], inputs[file]))
+	finally:
+		manifest.save()
 
 if __name__ == "__main__":
-	main()
\ No newline at end of file
+	main(incremental="--full" not in sys.argv)
\ No newline at end of file
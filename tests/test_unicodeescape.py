@@ -0,0 +1,17 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from unicodeescape import string_to_unicode_escape
+
+# Golden test for the shaping engine, the plain escape doesn't need output/thaiji.csv
+GOLDEN_TEXT = "พี่ป๋ำฎูนู๋เป่าฝุ่นหญู่ก้นปี่เท่าฐุลี"
+GOLDEN_RESULT = r"\u0e1e\u0e35\u0e48\u0e1b\uf711\uf716\u0e32\u0e0e\uf719\u0e19\u0e39\uf70d\u0e40\u0e1b\uf705\u0e32\u0e1d\u0e38\uf705\u0e19\u0e2b\uf70f\u0e39\uf70a\u0e01\uf70b\u0e19\u0e1b\uf702\uf713\u0e40\u0e17\uf70a\u0e32\uf700\u0e38\u0e25\u0e35"
+
+class GoldenTest(unittest.TestCase):
+	def test_shaping(self):
+		self.assertEqual(string_to_unicode_escape(GOLDEN_TEXT, False), GOLDEN_RESULT)
+
+if __name__ == "__main__":
+	unittest.main()
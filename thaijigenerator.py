@@ -1,37 +1,65 @@
 from lib.unicodetools import NC, AC, RC, DC, NV, BV, AV, tone, HCC, MCC, LCC
 from PIL import Image, ImageDraw, ImageFont
-from unicodeescape import string_to_unicode_escape
+from unicodeescape import string_to_unicode_escape, thaiji_table_path
+from lib.codec import write_thaiji_table
+from lib.atlas import pack
+from lib.effects import apply_effects
+from lib.ftb import Character, File as FTBFile
+from lib.manifest import file_hash
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import hashlib
+import json
 import os
 import csv
+import time
+
+# base consonants in the order find_consonant prefers them, and characters that are their own base
+CONSONANT_ORDER = {c: i for i, c in enumerate(NC + AC + RC + DC + ["\uf700", "\uf70f"])}
+STANDALONE_CHARS = frozenset(NV + [chr(i) for i in range(33, 127)] + [chr(i) for i in range(3585, 3676)])
 
 def find_consonant(text: str) -> str:
-	for c in NC + AC + RC + DC + ["\uf700", "\uf70f"]:
-		if c in text:
-			return c
-	if len(text) == 1:
-		for v in NV:
-			if v == text:
-				return v
-		for latin in range(33, 127):
-			if chr(latin) == text:
-				return chr(latin)
-		for thai in range(3585, 3676):
-			if chr(thai) == text:
-				return chr(thai)
+	consonant = min((c for c in text if c in CONSONANT_ORDER), key=CONSONANT_ORDER.__getitem__, default=None)
+	if consonant:
+		return consonant
+	if len(text) == 1 and text in STANDALONE_CHARS:
+		return text
 	return "ก"
 
-def text_to_image(text: str, font_path: str, font_size: int, image_path: str, cell_height: int, padding_x: int = 5, do_escape: bool = True, font_name: str = None):
-	if not os.path.exists(os.path.dirname(image_path)):
-		os.makedirs(os.path.dirname(image_path))
+@lru_cache(maxsize=None)
+def load_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+	# each process loads a font once and reuses it for every glyph
+	return ImageFont.truetype(font_path, font_size)
+
+@lru_cache(maxsize=None)
+def reference_bbox(font_path: str, font_size: int, consonant: str) -> "tuple[int, int, int, int]":
+	# the tallest stack on a base consonant, every glyph built on it gets the same cell
+	return load_font(font_path, font_size).getbbox(consonant + "\uf719" + "่")
+
+def glyph_bbox(text: str, font_path: str, font_size: int) -> "tuple[int, int, int, int]":
+	# printable ASCII is measured on its own, everything else uses its consonant's reference box
+	if len(text) == 1 and ord(text) >= 32 and ord(text) <= 126:
+		return load_font(font_path, font_size).getbbox(text)
+	return reference_bbox(font_path, font_size, find_consonant(text))
+
+def font_style(font: dict) -> dict:
+	# how a fonts entry draws its glyphs: fill, stroke and the post-processing effects from lib.effects
+	return {
+		"fill": list(font.get("fill", (255, 255, 255, 255))),
+		"stroke_width": font.get("stroke_width", 0),
+		"stroke_fill": list(font["stroke_fill"]) if "stroke_fill" in font else None,
+		"effects": font.get("effects", []),
+	}
 
+def render_glyph(text: str, font_path: str, font_size: int, cell_height: int, padding_x: int = 5, do_escape: bool = True, font_name: str = None, style: dict = None) -> Image.Image:
 	if do_escape:
 		text = string_to_unicode_escape(text, False).replace("\\\\", "\\").encode("utf-8").decode("unicode-escape")
+	if style is None:
+		style = font_style(fonts.get(font_name, {}))
 
 	# Load font
-	font = ImageFont.truetype(font_path, font_size)
-	bbox = font.getbbox(text)
-	if len(text) > 1 or not (ord(text) >= 32 and ord(text) <= 126):
-		bbox = font.getbbox(find_consonant(text) + "\uf719" + "่")
+	font = load_font(font_path, font_size)
+	bbox = glyph_bbox(text, font_path, font_size)
 	cell_width = bbox[2] - bbox[0] + padding_x * 2
 
 	# Create a blank image with transparent background
@@ -41,31 +69,14 @@ def text_to_image(text: str, font_path: str, font_size: int, image_path: str, ce
 
 	# align text center and draw
 	text_width, text_height = bbox[2:]
-	if font_name == "font_11":
-		draw.text(((image.width - text_width) // 2, (image.height - text_height) // 2), text, font=font, fill=(255, 255, 255, 255), stroke_width=1, stroke_fill=(255, 255, 255, 0))
-	elif font_name == "font_05":
-		# draw text shadow
-		shadow_color = (50, 50, 50, 0)
-		draw.text(((image.width - text_width) // 2 + 1, (image.height - text_height) // 2 + 1), text, font=font, fill=shadow_color)
-		draw.text(((image.width - text_width) // 2, (image.height - text_height) // 2), text, font=font, fill=(200, 200, 200, 255))
-	else:
-		draw.text(((image.width - text_width) // 2, (image.height - text_height) // 2), text, font=font, fill=(255, 255, 255, 255))
-
-	# pixels = image.load()
-	# if font_name != "font_11":
-	# 	# copy pixel values from alpha to r, g, and b channels
-	# 	for y in range(image.height):
-	# 		for x in range(image.width):
-	# 			alpha = pixels[x, y][3]
-	# 			pixels[x, y] = (alpha, alpha, alpha, alpha)
-		
-	if font_name == "font_11":
-		image = image.crop((0, 0, image.width, image.height - 10))
-	elif font_name == "font_04":
-		image = image.crop((0, 0, image.width, image.height - 14))
-
-	# Save image
-	image.save(image_path)
+	stroke_fill = tuple(style["stroke_fill"]) if style["stroke_fill"] else None
+	draw.text(((image.width - text_width) // 2, (image.height - text_height) // 2), text, font=font, fill=tuple(style["fill"]), stroke_width=style["stroke_width"], stroke_fill=stroke_fill)
+
+	return apply_effects(image, style["effects"])
+
+def text_to_image(text: str, font_path: str, font_size: int, image_path: str, cell_height: int, padding_x: int = 5, do_escape: bool = True, font_name: str = None, style: dict = None):
+	os.makedirs(os.path.dirname(image_path), exist_ok=True)
+	render_glyph(text, font_path, font_size, cell_height, padding_x, do_escape, font_name, style).save(image_path)
 
 def generate_combinations(explicit_add: "list[str]" = None) -> "list[str]":
 	consonants = NC + AC + RC + DC
@@ -103,7 +114,32 @@ def generate_combinations(explicit_add: "list[str]" = None) -> "list[str]":
 
 	return sorted(list(set(combinations)))
 
-COMBINATIONS = generate_combinations(["ธุ์"])
+# Combinations are cached in a newline-separated file stamped with a hash of the inputs they were generated from,
+# bump COMBINATIONS_VERSION when the rules in generate_combinations change
+COMBINATIONS_PATH = "output/combinations.txt"
+COMBINATIONS_VERSION = 1
+EXPLICIT_COMBINATIONS = ("ธุ์",)
+
+def combinations_key(explicit_add: "tuple[str]") -> str:
+	inputs = [COMBINATIONS_VERSION, NC, AC, RC, DC, BV, AV, tone, HCC, LCC, list(explicit_add)]
+	return hashlib.sha1(json.dumps(inputs).encode("utf-8")).hexdigest()
+
+@lru_cache(maxsize=None)
+def get_combinations(explicit_add: "tuple[str]" = EXPLICIT_COMBINATIONS, path: str = COMBINATIONS_PATH) -> "list[str]":
+	# generated once and persisted, later runs only read the cached table
+	key = combinations_key(explicit_add)
+	if os.path.exists(path):
+		with open(path, "r", encoding="utf-8") as f:
+			stamp, *combinations = f.read().split("\n")
+		if stamp == key:
+			return combinations
+
+	combinations = generate_combinations(list(explicit_add))
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+		f.write("\n".join([key] + combinations))
+	os.replace(f"{path}.tmp", path)
+	return combinations
 
 def generate_thaiji_csv(comb: "list[str]", path: str):
 	with open(path, "w", newline="", encoding="utf-8") as f:
@@ -112,94 +148,228 @@ def generate_thaiji_csv(comb: "list[str]", path: str):
 		for i, c in enumerate(comb):
 			writer.writerow([c, string_to_unicode_escape(c, False), 3712 + i])
 
+	# binary copy for unicodeescape, stamped with the csv it was built from
+	with open(path, "rb") as f:
+		stamp = hashlib.sha1(f.read()).digest()
+	with open(thaiji_table_path(path), "wb") as f:
+		f.write(write_thaiji_table({c: 3712 + i for i, c in enumerate(comb)}, stamp))
+
 def generate_shell_code(comb: "list[str]", path: str):
 	with open(path, "w") as f:
 		for i, c in enumerate(comb):
 			f.write(f"--char $((16#{3712 + i:04x})) fonts/${{1}}/{3712 + i:04x}.png \\\n")
 
-def generate_font_images(font_name: str, fonts: dict, generate_thai: bool = False, generate_latin: bool = False, generate_thaiji: bool = False):
-	print(f"----* Generating images for {font_name}... *----")
-
+def font_image_jobs(font_name: str, fonts: dict, generate_thai: bool = False, generate_latin: bool = False, generate_thaiji: bool = False) -> "list[tuple]":
+	# text_to_image arguments for every glyph of a font
 	font = fonts[font_name]
+	style = font_style(font)
+	jobs = []
 
 	if generate_thai:
-		print("Generating normal Thai characters...")
 		for i in range(3585, 3676):
 			if i in [3633, 3635, 3636, 3637, 3638, 3639, 3640, 3641, 3642, 3643, 3644, 3645, 3646, 3655, 3656, 3657, 3658, 3659, 3660, 3661, 3662]:
 				continue
-			text_to_image(chr(i), font["path"], font["size"], f"output/{font_name}/thai/{i:04x}.png", font["cell_height"], font["padding_x"], False, font_name=font_name)
+			jobs.append((chr(i), font["path"], font["size"], f"output/{font_name}/thai/{i:04x}.png", font["cell_height"], font["padding_x"], False, font_name, style))
 
 	if generate_latin:
-		print("Generating latin characters...")
 		for i in range(33, 127):
-			text_to_image(chr(i), font["path"], font["size"], f"output/{font_name}/latin/{i:04x}.png", font["cell_height"], font["padding_x"], False, font_name=font_name)
+			jobs.append((chr(i), font["path"], font["size"], f"output/{font_name}/latin/{i:04x}.png", font["cell_height"], font["padding_x"], False, font_name, style))
 
 	if generate_thaiji:
 		start = 3712
-		print("Generating Thaiji characters...")
-		for c in COMBINATIONS:
-			text_to_image(c, font["path"], font["size"], f"output/{font_name}/thaiji/{start:04x}.png", font["cell_height"], font["padding_x"], font_name=font_name)
+		for c in get_combinations():
+			jobs.append((c, font["path"], font["size"], f"output/{font_name}/thaiji/{start:04x}.png", font["cell_height"], font["padding_x"], True, font_name, style))
 			start += 1
 
+	return jobs
+
+def render_job(job: tuple):
+	text_to_image(*job)
+
+# Manifest of image path -> key of the inputs it was rendered from, bump RENDER_VERSION when text_to_image changes
+GLYPH_CACHE_PATH = "output/glyph_cache.json"
+RENDER_VERSION = 2
+
+# a font is hashed once per process however many glyphs use it
+font_hash = lru_cache(maxsize=None)(file_hash)
+
+def glyph_key(job: tuple) -> str:
+	# fonts with the same style render the same way, the name itself is not part of the key
+	text, font_path, font_size, image_path, cell_height, padding_x, do_escape, font_name, style = job
+	key = [RENDER_VERSION, font_hash(font_path), font_size, cell_height, padding_x, do_escape, style, text]
+	return hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_glyph_cache(path: str = GLYPH_CACHE_PATH) -> "dict[str, str]":
+	if not os.path.exists(path):
+		return {}
+	with open(path, "r", encoding="utf-8") as f:
+		return json.load(f)
+
+def save_glyph_cache(cache: "dict[str, str]", path: str = GLYPH_CACHE_PATH):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+		json.dump(cache, f, indent=0, sort_keys=True)
+	os.replace(f"{path}.tmp", path)
+
+def render_jobs(jobs: "list[tuple]", workers: int = None, use_cache: bool = True):
+	# spread glyphs over a process pool, every worker keeps its own loaded fonts.
+	# With use_cache only glyphs whose inputs changed or whose image is missing are rendered.
+	cache = load_glyph_cache() if use_cache else {}
+	keys = {job[3]: glyph_key(job) for job in jobs}
+	stale = [job for job in jobs if cache.get(job[3]) != keys[job[3]] or not os.path.exists(job[3])]
+	if len(stale) < len(jobs):
+		print(f"Skipping {len(jobs) - len(stale)} unchanged glyphs")
+
+	workers = workers or os.cpu_count()
+	start = time.perf_counter()
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		for _ in pool.map(render_job, stale, chunksize=64):
+			pass
+	elapsed = time.perf_counter() - start
+	print(f"Rendered {len(stale)} glyphs in {elapsed:.2f}s ({len(stale) / elapsed if elapsed else 0:.0f} glyphs/s, {workers} workers)")
+
+	if use_cache and stale:
+		cache = load_glyph_cache()
+		cache.update((job[3], keys[job[3]]) for job in stale)
+		save_glyph_cache(cache)
+
+def generate_font_images(font_name: str, fonts: dict, generate_thai: bool = False, generate_latin: bool = False, generate_thaiji: bool = False, workers: int = None):
+	print(f"----* Generating images for {font_name}... *----")
+	render_jobs(font_image_jobs(font_name, fonts, generate_thai, generate_latin, generate_thaiji), workers)
+
+def generate_all_font_images(font_names: "list[str]", fonts: dict, generate_thai: bool = False, generate_latin: bool = False, generate_thaiji: bool = False, workers: int = None):
+	# one pool for every font so the cores stay busy across font boundaries
+	print(f"----* Generating images for {', '.join(font_names)}... *----")
+	jobs = []
+	for font_name in font_names:
+		jobs += font_image_jobs(font_name, fonts, generate_thai, generate_latin, generate_thaiji)
+	render_jobs(jobs, workers)
+
+def render_atlas_job(job: tuple) -> Image.Image:
+	text, font_path, font_size, image_path, cell_height, padding_x, do_escape, font_name, style = job
+	return render_glyph(text, font_path, font_size, cell_height, padding_x, do_escape, font_name, style)
+
+def build_font_atlas(font_name: str, fonts: dict, ftb: FTBFile, first_tex_id: int, page_size: "tuple[int, int]" = (2048, 2048), padding: int = 1, workers: int = None,
+		generate_thai: bool = False, generate_latin: bool = False, generate_thaiji: bool = False) -> "list[Image.Image]":
+	# Render glyphs in memory, pack them into texture pages and write their records into ftb.
+	# Glyphs land on pages first_tex_id, first_tex_id + 1, ... and replace the records with the same unicode.
+	# Glyphs that are not replaced keep their texId, so first_tex_id has to be past the font's existing textures;
+	# the texture table in the FTB header is not touched and needs the new pages added separately.
+	print(f"----* Building atlas for {font_name}... *----")
+	jobs = font_image_jobs(font_name, fonts, generate_thai, generate_latin, generate_thaiji)
+	with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+		images = list(pool.map(render_atlas_job, jobs, chunksize=64))
+
+	placements = pack([image.size for image in images], *page_size, padding)
+	pages = [Image.new("RGBA", page_size, (0, 0, 0, 0)) for _ in range(max((page for page, _, _ in placements), default=-1) + 1)]
+	characters = []
+	for job, image, (page, x, y) in zip(jobs, images, placements):
+		pages[page].paste(image, (x, y))
+		# image names are the glyph's code point, same as generate_shell_code expects
+		unicode = int(os.path.splitext(os.path.basename(job[3]))[0], 16)
+		characters.append(Character(unicode, first_tex_id + page, image.width, image.height, x, y))
+	ftb.replace_characters(characters)
+
+	used = sum(image.width * image.height for image in images)
+	print(f"Packed {len(images)} glyphs into {len(pages)} pages ({used / (len(pages) * page_size[0] * page_size[1]) if pages else 0:.0%} used)")
+	return pages
+
+def generate_font_atlas(font_name: str, fonts: dict, ftb_path: str, output_path: str, first_tex_id: int, page_size: "tuple[int, int]" = (2048, 2048), workers: int = None,
+		generate_thai: bool = False, generate_latin: bool = False, generate_thaiji: bool = False):
+	# writes output/{font_name}/atlas/{texId}.png and the updated .ftb to output_path
+	ftb = FTBFile.parse(ftb_path)
+	pages = build_font_atlas(font_name, fonts, ftb, first_tex_id, page_size, workers=workers, generate_thai=generate_thai, generate_latin=generate_latin, generate_thaiji=generate_thaiji)
+	os.makedirs(f"output/{font_name}/atlas", exist_ok=True)
+	for i, page in enumerate(pages):
+		page.save(f"output/{font_name}/atlas/{first_tex_id + i}.png")
+	ftb.rewrite(output_path)
+
+# effects run in order after drawing, see lib.effects for the available ones
 fonts = {
 	"font_01": {
 		"path": "fonts/FC Iconic Regular.ttf",
 		"size": 38,
 		"cell_height": 52,
 		"padding_x": 5,
+		"effects": [
+			{"type": "alpha_to_rgb"},
+		],
 	},
 	"font_36": {
 		"path": "fonts/FC Iconic Light.ttf",
 		"size": 38,
 		"cell_height": 52,
 		"padding_x": 5,
+		"effects": [
+			{"type": "alpha_to_rgb"},
+		],
 	},
 	"font_11": {
 		"path": "fonts/LayijiMahaniyomV1.ttf",
 		"size": 38,
 		"cell_height": 60,
 		"padding_x": 4,
+		"stroke_width": 1,
+		"stroke_fill": (255, 255, 255, 0),
+		"effects": [
+			{"type": "crop", "bottom": 10},
+		],
 	},
 	"font_05": {
 		"path": "fonts/FC Iconic Medium.ttf",
 		"size": 30,
 		"cell_height": 41,
 		"padding_x": 6,
+		"fill": (200, 200, 200, 255),
+		"effects": [
+			{"type": "alpha_to_rgb"},
+		],
 	},
 	"font_04": {
 		"path": "fonts/supermarket_test.ttf",
 		"size": 38,
 		"cell_height": 68,
 		"padding_x": 5,
+		"effects": [
+			{"type": "alpha_to_rgb"},
+			{"type": "crop", "bottom": 14},
+		],
 	},
 	"font_00": {
 		"path": "fonts/2005_iannnnnAMD.ttf",
 		"size": 52,
 		"cell_height": 52,
 		"padding_x": 5,
+		"effects": [
+			{"type": "alpha_to_rgb"},
+		],
 	},
 	"font_03": {
 		"path": "fonts/TP Tankhun Bold.ttf",
 		"size": 54,
 		"cell_height": 60,
 		"padding_x": 5,
+		"effects": [
+			{"type": "alpha_to_rgb"},
+		],
 	},
 	"font_02": {
 		"path": "fonts/FC Iconic Medium.ttf",
 		"size": 72,
 		"cell_height": 80,
 		"padding_x": 5,
+		"effects": [
+			{"type": "alpha_to_rgb"},
+		],
 	}
 }
 
-generate_thaiji_csv(COMBINATIONS, "output/thaiji.csv")
-# generate_shell_code(COMBINATIONS, "output/code.txt")
-
-generate_font_images("font_00", fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
-generate_font_images("font_01", fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
-generate_font_images("font_02", fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
-generate_font_images("font_03", fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
-generate_font_images("font_04", fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
-generate_font_images("font_05", fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
-generate_font_images("font_11", fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
-generate_font_images("font_36", fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
\ No newline at end of file
+def main():
+	generate_thaiji_csv(get_combinations(), "output/thaiji.csv")
+	# generate_shell_code(get_combinations(), "output/code.txt")
+	# generate_font_atlas("font_01", fonts, "font_01.ftb", "output/font_01/font_01.ftb", first_tex_id=4, generate_thai=True, generate_latin=True, generate_thaiji=True)
+
+	generate_all_font_images(["font_00", "font_01", "font_02", "font_03", "font_04", "font_05", "font_11", "font_36"], fonts, generate_thai=True, generate_latin=True, generate_thaiji=True)
+
+if __name__ == "__main__":
+	main()
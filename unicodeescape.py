@@ -1,15 +1,101 @@
-from tkinter import filedialog, Tk
 import lib.unicodetools as ut
 import os
+from lib.batch import run_batch
+from lib.codec import read_thaiji_table
 from lib.unicodetools import tone, AC, AV, BV, DC, NC, RC, LLT, ULT, LRT, SDBV, LV
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import json
 import csv
+import re
+
+THAIJI_PATH = "output/thaiji.csv"
+
+def thaiji_table_path(path: str = THAIJI_PATH) -> str:
+	# binary table written next to the csv by thaijigenerator.generate_thaiji_csv
+	return os.path.splitext(path)[0] + ".bin"
+
+@lru_cache(maxsize=None)
+def thaiji_digest(path: str = THAIJI_PATH) -> bytes:
+	# sha1 of the csv, or the stamp of the binary table when only that exists
+	if not os.path.exists(path):
+		with open(thaiji_table_path(path), "rb") as f:
+			return read_thaiji_table(f.read())[0]
+	with open(path, "rb") as f:
+		return hashlib.sha1(f.read()).digest()
+
+@lru_cache(maxsize=None)
+def load_thaiji(path: str = THAIJI_PATH) -> "dict[str, int]":
+	# read on first use so importing this module never touches disk.
+	# The binary table is used when its stamp matches the csv, otherwise the csv is parsed.
+	thaiji = None
+	table_path = thaiji_table_path(path)
+	if os.path.exists(table_path):
+		with open(table_path, "rb") as f:
+			stamp, table = read_thaiji_table(f.read())
+		if stamp == thaiji_digest(path):
+			thaiji = table
+		else:
+			print(f"{table_path} does not match {path}, regenerate it with thaijigenerator.py")
+
+	if thaiji is None:
+		with open(path, "r", encoding="utf-8") as f:
+			reader = csv.reader(f)
+			next(reader)
+			thaiji = {row[0]: int(row[2]) for row in reader}
 
-with open("output/thaiji.csv", "r", encoding="utf-8") as f:
-	reader = csv.reader(f)
-	next(reader)
-	thaiji = {row[0]: int(row[2]) for row in reader}
 	# sort by len of key
-	thaiji = dict(sorted(thaiji.items(), key=lambda x: len(x[0]), reverse=True))
+	return dict(sorted(thaiji.items(), key=lambda x: len(x[0]), reverse=True))
+
+class Escaper:
+	# Single-pass longest-match transducer equivalent to the str.replace chains in string_to_thaiji_escape.
+	# Every thaiji key starts with a base consonant and contains no other consonant, so matching the longest
+	# key at each position from left to right gives the same result as replacing the longest keys first.
+	# Runs of Thai/CJK characters are rewritten through the table; existing \uxxxx escapes are remapped.
+	def __init__(self, table: "dict[str, int]", is_tranform: bool = True):
+		remap = ut.UNICODE_MAP_ESCAPED if is_tranform else {}
+		self.remap = remap
+		self.table = {}
+		for key, unicode in table.items():
+			escaped = f"\\u{unicode:04x}"
+			self.table[key] = remap.get(escaped, escaped)
+		self.lengths = sorted({len(key) for key in table}, reverse=True)
+		self.chars = {}
+		for i in list(range(3585, 3676)) + list(range(12288, 12352)):
+			escaped = f"\\u{i:04x}"
+			self.chars[chr(i)] = remap.get(escaped, escaped)
+		if is_tranform:
+			self.pattern = re.compile(r"[\u0e01-\u0e5b\u3000-\u303f]+|\\u[0-9a-f]{4}")
+		else:
+			self.pattern = re.compile(r"[\u0e01-\u0e5b\u3000-\u303f]+")
+
+	def _replace(self, match: "re.Match") -> str:
+		run = match.group()
+		if run[0] == "\\":
+			return self.remap.get(run, run)
+
+		table, chars, lengths = self.table, self.chars, self.lengths
+		result = []
+		i = 0
+		while i < len(run):
+			for length in lengths:
+				key = run[i:i+length]
+				if key in table:
+					result.append(table[key])
+					i += length
+					break
+			else:
+				result.append(chars[run[i]])
+				i += 1
+		return "".join(result)
+
+	def escape(self, text: str) -> str:
+		return self.pattern.sub(self._replace, text)
+
+@lru_cache(maxsize=None)
+def get_escaper(is_tranform: bool = True) -> Escaper:
+	return Escaper(load_thaiji(), is_tranform)
 
 def decompose_sara_am(text: str):
 	# SARA AM (U+0E33) must be decomposed into NIKHAHIT (U+0E4D) and SARA AA (U+0E32).
@@ -23,135 +109,199 @@ def decompose_sara_am(text: str):
 			break
 	return text
 
-def above_mark_with_AC(text: str):
-	# Any above-base combining mark (T, AV) that combines to consonant with extra ascender (AC) must be shifted left.
-	# This is done by replacing the tone mark with 
-	# case 1: AC + T (replace T with LLT)
-	# case 2: AC + AV + T (replace T with ULT)
-	# case 3: AC + BV + T (replace T with LLT)
-	# finally: replace AV with LV
-	
-	# case 1
-	for ac in AC:
-		for t in tone:
-			text = text.replace(ac+t, ac+LLT[tone.index(t)])
-	
-	# case 2
-	for ac in AC:
-		for av in AV:
-			for t in tone:
-				text = text.replace(ac+av+t, ac+av+ULT[tone.index(t)])
-
-	# case 3
-	for ac in AC:
-		for bv in BV:
-			for t in tone:
-				text = text.replace(ac+bv+t, ac+bv+LLT[tone.index(t)])
-	
-	# finally
-	for ac in AC:
-		for av in AV:
-			text = text.replace(ac+av, ac+LV[AV.index(av)])
-
-	return text
-
-def tone_without_AV(text: str):
-	# If tone mark (T) is present without upper vowel (AV), it must be lower down.
-	# This is done by replacing the tone mark with a low right tone mark (LRT) if a tone mark is placed immediately after a consonant.
+# Shaping rules applied to each grapheme cluster, keyed by the classes of the base consonant and the marks after it.
+# Each entry holds one substitution per position (None keeps the character as is). Longer clusters are tried first.
+# AC + T: shift the tone down-left (LLT); AC + AV (+ T): shift the vowel left (LV) and the tone up-left (ULT);
+# AC + BV + T: shift the tone down-left (LLT); C + (BV +) T: lower the tone (LRT) when there is no upper vowel;
+# DC + BV: lower the below vowel (SDBV); RC + BV: replace the consonant with its descender-less form.
+LLT_MAP = dict(zip(tone, LLT))
+ULT_MAP = dict(zip(tone, ULT))
+LRT_MAP = dict(zip(tone, LRT))
+LV_MAP = dict(zip(AV, LV))
+SDBV_MAP = dict(zip(BV, SDBV))
+RC_MAP = {"ฐ": "\\uf700", "ญ": "\\uf70f"}
 
-	# case 1: C + T
-	for c in NC+RC+DC:
-		for t in tone:
-			text = text.replace(c+t, c+LRT[tone.index(t)])
+SHAPING_RULES = {
+	("AC", "T"): (None, LLT_MAP),
+	("AC", "AV", "T"): (None, LV_MAP, ULT_MAP),
+	("AC", "AV"): (None, LV_MAP),
+	("AC", "BV", "T"): (None, None, LLT_MAP),
+	("NC", "T"): (None, LRT_MAP),
+	("NC", "BV", "T"): (None, None, LRT_MAP),
+	("RC", "T"): (None, LRT_MAP),
+	("RC", "BV", "T"): (RC_MAP, None, LRT_MAP),
+	("RC", "BV"): (RC_MAP, None),
+	("DC", "T"): (None, LRT_MAP),
+	("DC", "BV", "T"): (None, SDBV_MAP, LRT_MAP),
+	("DC", "BV"): (None, SDBV_MAP),
+}
 
-	# case 2: C + BV + T
-	for c in NC+RC+DC:
-		for bv in BV:
-			for t in tone:
-				text = text.replace(c+bv+t, c+bv+LRT[tone.index(t)])
+CHAR_CLASSES = {}
+for name, chars in [("NC", NC), ("AC", AC), ("RC", RC), ("DC", DC), ("AV", AV), ("BV", BV), ("T", tone)]:
+	for c in chars:
+		CHAR_CLASSES[c] = name
 
-	return text
-
-def deal_with_DC(text: str):
-	# If below vowel (BV) combines to consonant with strict descender (DC), it must be lowered down.
-	# This is done by replacing the below vowel with a shifted down below vowel (SDBV).
-	for dc in DC:
-		for bv in BV:
-			text = text.replace(dc+bv, dc+SDBV[BV.index(bv)])
+class Shaper:
+	# Table-driven replacement for the per-rule str.replace loops of string_to_unicode_escape.
+	# Each run of Thai characters is walked once, cluster by cluster, and written out as \uxxxx escapes.
+	def __init__(self, is_tranform: bool = True):
+		remap = ut.UNICODE_MAP_ESCAPED if is_tranform else {}
+		self.remap = remap
+		self.chars = {}
+		for i in range(3585, 3676):
+			escaped = f"\\u{i:04x}"
+			self.chars[chr(i)] = remap.get(escaped, escaped)
+		self.rules = {}
+		for classes, substitutions in SHAPING_RULES.items():
+			self.rules[classes] = tuple({k: remap.get(v, v) for k, v in s.items()} if s else None for s in substitutions)
+		if is_tranform:
+			self.pattern = re.compile(r"[\u0e01-\u0e5b]+|\\u[0-9a-f]{4}")
+		else:
+			self.pattern = re.compile(r"[\u0e01-\u0e5b]+")
 
-	return text
+	def _replace(self, match: "re.Match") -> str:
+		run = match.group()
+		if run[0] == "\\":
+			return self.remap.get(run, run)
 
-def deal_with_RC(text: str):
-	# If a RC is followed by a BV, use \uf700 to replace the ฐ and \uf70f to replace the ญ.
-	for rc in RC:
-		for bv in BV:
-			if rc == "ฐ":
-				text = text.replace(rc+bv, "\\uf700"+bv)
+		chars, rules = self.chars, self.rules
+		classes = [CHAR_CLASSES.get(c) for c in run]
+		result = []
+		i = 0
+		while i < len(run):
+			for length in (3, 2):
+				substitutions = rules.get(tuple(classes[i:i+length]))
+				if substitutions:
+					for c, substitution in zip(run[i:i+length], substitutions):
+						result.append(substitution[c] if substitution else chars[c])
+					i += length
+					break
 			else:
-				text = text.replace(rc+bv, "\\uf70f"+bv)
-	
-	return text
+				result.append(chars[run[i]])
+				i += 1
+		return "".join(result)
 
-def tranform_thai(text: str):
-	for map in ut.UNICODE_MAP_ESCAPED:
-		text = text.replace(map, ut.UNICODE_MAP_ESCAPED[map])
-	return text
+	def shape(self, text: str) -> str:
+		return self.pattern.sub(self._replace, text)
+
+@lru_cache(maxsize=None)
+def get_shaper(is_tranform: bool = True) -> Shaper:
+	return Shaper(is_tranform)
 
 def string_to_unicode_escape(text: str, is_tranform: bool = True):
 	text = decompose_sara_am(text)
-	text = above_mark_with_AC(text)
-	text = tone_without_AV(text)
-	text = deal_with_DC(text)
-	text = deal_with_RC(text)
-
-	result = ""
-	for c in text:
-		if ord(c) >= 3585 and ord(c) <= 3675:
-			result += f"\\u{ord(c):04x}"
-		else:
-			result += c
-
-	if is_tranform:
-		result = tranform_thai(result)
-
-	return result
+	return get_shaper(is_tranform).shape(text)
 
 def string_to_thaiji_escape(text: str, is_tranform: bool = True):
 	text = decompose_sara_am(text)
-	for key in thaiji:
-		text = text.replace(key, f"\\u{thaiji[key]:04x}")
+	return get_escaper(is_tranform).escape(text)
 
-	result = ""
-	for c in text:
-		if (ord(c) >= 3585 and ord(c) <= 3675) or (ord(c) >= 12288 and ord(c) <= 12351):
-			result += f"\\u{ord(c):04x}"
-		else:
-			result += c
+def thaiji_version(path: str = THAIJI_PATH) -> str:
+	# changes whenever the thaiji table is regenerated
+	return thaiji_digest(path).hex()[:16]
+
+class EscapeCache:
+	# Bounded LRU of string_to_thaiji_escape results, optionally loaded from and saved to path.
+	# A saved cache is only reused for the same thaiji table version and is_tranform.
+	def __init__(self, maxsize: int = 65536, path: str = None, is_tranform: bool = True):
+		self.maxsize = maxsize
+		self.path = path
+		self.is_tranform = is_tranform
+		self.version = f"{thaiji_version()}-{int(is_tranform)}"
+		self.entries = OrderedDict()
+		# results computed since the last take_added(), only tracked for persisted caches
+		self.added = {}
+		self.hits = 0
+		self.misses = 0
+		if path and os.path.exists(path):
+			with open(path, "r", encoding="utf-8") as f:
+				saved = json.load(f)
+			if saved.get("version") == self.version:
+				self.entries.update(list(saved["entries"].items())[-maxsize:])
+
+	def escape(self, text: str) -> str:
+		entries = self.entries
+		if text in entries:
+			self.hits += 1
+			entries.move_to_end(text)
+			return entries[text]
+		self.misses += 1
+		result = string_to_thaiji_escape(text, self.is_tranform)
+		self.add(text, result)
+		if self.path:
+			self.added[text] = result
+		return result
+
+	def add(self, text: str, result: str):
+		self.entries[text] = result
+		self.entries.move_to_end(text)
+		if len(self.entries) > self.maxsize:
+			self.entries.popitem(last=False)
+
+	def take_added(self) -> "dict[str, str]":
+		added, self.added = self.added, {}
+		return added
 
-	if is_tranform:
-		result = tranform_thai(result)
+	@property
+	def hit_rate(self) -> float:
+		total = self.hits + self.misses
+		return self.hits / total if total else 0.0
 
-	return result
+	def save(self):
+		if not self.path:
+			return
+		os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+		with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+			json.dump({"version": self.version, "entries": self.entries}, f, ensure_ascii=False, separators=(",", ":"))
+		os.replace(f"{self.path}.tmp", self.path)
 
-# test_result = r"\u0e1e\u0e35\u0e48\u0e1b\uf711\uf716\u0e32\u0e0e\uf719\u0e19\u0e39\uf70d\u0e40\u0e1b\uf705\u0e32\u0e1d\u0e38\uf705\u0e19\u0e2b\uf70f\u0e39\uf70a\u0e01\uf70b\u0e19\u0e1b\uf702\uf713\u0e40\u0e17\uf70a\u0e32\uf700\u0e38\u0e25\u0e35"
-# print(string_to_unicode_escape("พี่ป๋ำฎูนู๋เป่าฝุ่นหญู่ก้นปี่เท่าฐุลี") == test_result)
+	def __str__(self) -> str:
+		return f"EscapeCache(entries={len(self.entries)}, hits={self.hits}, misses={self.misses}, hit_rate={self.hit_rate:.1%})"
 
-def main():
+ESCAPE_CACHE_PATH = "output/escape_cache.json"
+
+@lru_cache(maxsize=None)
+def get_escape_cache(is_tranform: bool = True, path: str = None) -> EscapeCache:
+	# one cache per process, shared by every file it escapes
+	return EscapeCache(path=path, is_tranform=is_tranform)
+
+def escape_file(input_path: str, output_path: str, is_tranform: bool = True, buffer_lines: int = 1024) -> "tuple[int, int, dict[str, str]]":
+	# Escape a file line by line into a temp file next to output_path, holding at most buffer_lines lines.
+	# Returns the cache hits, misses and new entries so the parent process can merge and save them.
+	cache = get_escape_cache(is_tranform, ESCAPE_CACHE_PATH)
+	hits, misses = cache.hits, cache.misses
+	buffer = []
+	with open(input_path, "r", encoding="utf-8") as src, open(f"{output_path}.tmp", "w", encoding="utf-8") as dst:
+		for line in src:
+			buffer.append(cache.escape(line))
+			if len(buffer) >= buffer_lines:
+				dst.write("".join(buffer))
+				buffer.clear()
+		dst.write("".join(buffer))
+	os.replace(f"{output_path}.tmp", output_path)
+	return cache.hits - hits, cache.misses - misses, cache.take_added()
+
+def main(workers: int = None):
+	from tkinter import filedialog, Tk
 	Tk().withdraw()
 	file_paths = filedialog.askopenfilenames(initialdir="C:/Users/modda/OneDrive/Documents/OmegaT Project/target", title="Select translated files")
 	save_dir = filedialog.askdirectory(initialdir="C:/Users/modda/OneDrive/Documents/OmegaT Project/unicodeescaped", title="Select save directory")
 	
-	for file_path in file_paths:
-		file_name = os.path.basename(file_path)
-		print(f"Processing {file_name}...")
-
-		escaped_text = ""
-		with open(file_path, "r", encoding="utf-8") as f:
-			text = f.read()
-			escaped_text = string_to_thaiji_escape(text)
+	# lines repeat a lot across files, each worker escapes a distinct line once and the results are saved for next time
+	cache = get_escape_cache(True, ESCAPE_CACHE_PATH)
+	tasks = [(os.path.basename(file_path), (file_path, f"{save_dir}/{os.path.basename(file_path)}")) for file_path in file_paths]
+	def done(file_name: str, result: tuple):
+		hits, misses, added = result
+		cache.hits += hits
+		cache.misses += misses
+		for text, escaped in added.items():
+			cache.add(text, escaped)
 
-		with open(f"{save_dir}/{file_name}", "w", encoding="utf-8") as f:
-			f.write(escaped_text)
+	try:
+		run_batch(escape_file, tasks, workers, done=done)
+	finally:
+		cache.save()
+	print(cache)
 
 if __name__ == "__main__":
 	main()
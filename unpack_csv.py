@@ -1,45 +1,118 @@
 import csv
+import hashlib
 import os
+import sys
 from dotenv import load_dotenv
-from unicodeescape import string_to_thaiji_escape
+from unicodeescape import get_escape_cache, thaiji_version
+from lib.batch import run_batch
+from lib.manifest import Manifest
 
 load_dotenv()
 
-def create_properties_file(output_path: str, key_list: "list[str]", th_value_list: "list[str]", en_value_list: "list[str]") -> None:
-	output_path_base = os.path.dirname(output_path)
-	if not os.path.exists(output_path_base):
-		os.makedirs(output_path_base)
+def write_properties_file(output_path: str, rows: "Iterable[tuple[str, str, str]]") -> None:
+	# rows are (key, thai, english), written as they come in
+	# files are written from several processes at once
+	os.makedirs(os.path.dirname(output_path), exist_ok=True)
 	
 	with open(output_path, "w", encoding="utf-8") as f:
-		for key, th_value, en_value in zip(key_list, th_value_list, en_value_list):
-			if th_value == "":
-				f.write(f"{key}={en_value}\n")
-			else:
-				f.write(f"{key}={string_to_thaiji_escape(th_value)}\n")
+		f.writelines(f"{key}={en_value}\n" if th_value == "" else f"{key}={get_escape_cache().escape(th_value)}\n" for key, th_value, en_value in rows)
 
-def parse_csv(path: str) -> "tuple[list[str], list[str]]":
-	key_list = []
-	en_value_list = []
-	th_value_list = []
+def create_properties_file(output_path: str, key_list: "list[str]", th_value_list: "list[str]", en_value_list: "list[str]") -> None:
+	write_properties_file(output_path, zip(key_list, th_value_list, en_value_list))
+
+def iter_csv(path: str) -> "Iterator[tuple[str, str, str]]":
+	# stream (key, thai, english) rows
 	with open(path, "r", encoding="utf-8") as f:
 		reader = csv.reader(f)
 		next(reader)
 		for row in reader:
-			key_list.append(row[0]) # key
-			en_value_list.append(row[1]) # english
-			th_value_list.append(row[3]) # thai
+			yield row[0], row[3], row[1]
+
+def parse_csv(path: str) -> "tuple[list[str], list[str]]":
+	key_list = []
+	en_value_list = []
+	th_value_list = []
+	for key, th_value, en_value in iter_csv(path):
+		key_list.append(key) # key
+		en_value_list.append(en_value) # english
+		th_value_list.append(th_value) # thai
 	return key_list, th_value_list, en_value_list
 
-def main():
+def row_digest(key: str, th_value: str, en_value: str) -> str:
+	return hashlib.sha1(f"{key}\0{th_value}\0{en_value}".encode("utf-8")).hexdigest()[:16]
+
+def unpack_csv(csv_path: str, output_path: str, previous_rows: "list[str]" = None) -> "list[str]":
+	# previous_rows are the row digests the existing output was written from, one per line.
+	# Lines of rows that did not change are copied instead of escaped again. Returns the new digests.
+	reuse = {}
+	if previous_rows and os.path.exists(output_path):
+		with open(output_path, "r", encoding="utf-8") as f:
+			lines = f.readlines()
+		if len(lines) == len(previous_rows):
+			reuse = dict(zip(previous_rows, lines))
+
+	digests = []
+	def lines():
+		for key, th_value, en_value in iter_csv(csv_path):
+			digest = row_digest(key, th_value, en_value)
+			digests.append(digest)
+			if digest in reuse:
+				yield reuse[digest]
+			elif th_value == "":
+				yield f"{key}={en_value}\n"
+			else:
+				yield f"{key}={get_escape_cache().escape(th_value)}\n"
+
+	# the old output is replaced only once the new one is complete
+	os.makedirs(os.path.dirname(output_path), exist_ok=True)
+	with open(f"{output_path}.tmp", "w", encoding="utf-8") as f:
+		f.writelines(lines())
+	os.replace(f"{output_path}.tmp", output_path)
+	return digests
+
+def unpack_task(csv_path: str, output_path: str, previous_rows: "list[str]" = None) -> "tuple[list[str], int, int]":
+	# unpack_csv plus the escape cache hits and misses it caused in this worker
+	cache = get_escape_cache()
+	hits, misses = cache.hits, cache.misses
+	digests = unpack_csv(csv_path, output_path, previous_rows)
+	return digests, cache.hits - hits, cache.misses - misses
+
+MANIFEST_PATH = "output/unpack_manifest.json"
+
+def main(workers: int = None, incremental: bool = True):
 	csv_base_path = os.getenv("CSV_BASE_PATH")
 	th_base_path = os.getenv("TH_BASE_PATH")
 	csv_files = [file for file in os.listdir(csv_base_path) if file.endswith(".csv")]
 
+	tasks = []
 	for file in csv_files:
-		print(f"Processing {file}...")
 		file_name = file.split(".")[0]
-		key_list, th_value_list, en_value_list = parse_csv(f"{csv_base_path}/{file}")
-		create_properties_file(f"{th_base_path}/{file_name}_th.properties", key_list, th_value_list, en_value_list)
+		tasks.append((file, (f"{csv_base_path}/{file}", f"{th_base_path}/{file_name}_th.properties")))
+
+	# With incremental only changed csv files are unpacked, and only their changed rows are escaped.
+	# A new thaiji table invalidates every line, its version is recorded since the csv or the .bin may be the only copy.
+	manifest = Manifest(MANIFEST_PATH)
+	thaiji = thaiji_version()
+	inputs = {file: [args[0]] for file, args in tasks}
+	outputs = {file: args[1] for file, args in tasks}
+	if incremental:
+		def same_table(output: str) -> bool:
+			return manifest.get(output, "thaiji") == thaiji
+		tasks = [(file, (*args, manifest.get(args[1], "rows") if same_table(args[1]) else None)) for file, args in tasks if not (same_table(args[1]) and manifest.is_fresh(args[1], inputs[file]))]
+		print(f"{len(tasks)}/{len(csv_files)} files changed")
+
+	stats = [0, 0]
+	def done(file: str, result: tuple):
+		rows, hits, misses = result
+		manifest.record(outputs[file], inputs[file], rows=rows, thaiji=thaiji)
+		stats[0] += hits
+		stats[1] += misses
+
+	try:
+		run_batch(unpack_task, tasks, workers, done=done)
+	finally:
+		manifest.save()
+	print(f"Escape cache: {stats[0]} hits, {stats[1]} misses ({stats[0] / max(sum(stats), 1):.1%} hit rate)")
 
 if __name__ == "__main__":
-	main()
\ No newline at end of file
+	main(incremental="--full" not in sys.argv)
\ No newline at end of file